@@ -2,22 +2,34 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import base64
+import binascii
 import gzip
 import hashlib
 import json
+import multiprocessing
 import os
 import platform
+import queue
+import shutil
 import sqlite3
 import subprocess
 import sys
+import threading
 import time
-from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Optional, Iterable, Tuple
+from typing import Any, Callable, Deque, Dict, List, Optional, Iterable, Tuple, Union
 import getpass
 import stat as statmod
 
+# Valinnainen: orjson on moninkertaisesti nopeampi ja palauttaa suoraan bytes
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
 def fs_safe_text(s: str) -> str:
     """
     Tee filesystem-str:stä JSON/UTF-8-turvallinen.
@@ -33,18 +45,37 @@ def fs_bytes(p: Path) -> bytes:
 def fs_display_from_bytes(b: bytes) -> str:
     return b.decode("utf-8", "surrogateescape")
 
+def json_line(rec: Dict[str, Any]) -> bytes:
+    """
+    Kompakti JSON-rivi byteinä.
+    orjson ei hyväksy surrogaatteja (ei-UTF-8-nimet), joten ne kulkevat stdlibin kautta.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(rec)
+        except TypeError:
+            pass
+    return json.dumps(rec, ensure_ascii=False, separators=(",", ":")).encode("utf-8", "surrogateescape")
+
 def b64_bytes(b: bytes) -> str:
-    return base64.b64encode(b).decode("ascii")
+    # binascii suoraan: base64.b64encode on vain Python-kääre sen päällä
+    return binascii.b2a_base64(b, newline=False).decode("ascii")
 
-def rel_path_bytes(p: Path, root: Path) -> bytes:
-    try:
-        r = os.path.relpath(fs_bytes(p), fs_bytes(root))
-        if r in (b"", b"."):
-            return b"."
-        return r.replace(os.sep.encode(), b"/")
-    except Exception:
-        r = os.path.relpath(str(p), str(root)).replace(os.sep, "/")
-        return os.fsencode(r)
+def root_prefix_bytes(root: Path) -> bytes:
+    """
+    Rootin bytes-prefix (päättyy "/"), jonka walkerin polut alkavat.
+    """
+    b = fs_bytes(root)
+    return b if b.endswith(b"/") else b + b"/"
+
+
+def rel_path_bytes(p: bytes, root_prefix: bytes) -> bytes:
+    """
+    Walkerin bytes-polku suhteessa rootiin (root itse -> b".").
+    """
+    if not p.startswith(root_prefix):
+        return b"."
+    return p[len(root_prefix):] or b"."
 
 def rel_path(p: Path, root: Path) -> str:
     """
@@ -68,6 +99,48 @@ class Options:
     sqlite_fast: bool
     json_pretty: bool
     progress_every: int
+    hash_jobs: int
+    walk_jobs: int
+
+
+class BatchWriter:
+    """
+    Taustasäie, joka kirjoittaa tietue-eriä rajatusta jonosta (takaisinkytkentä tuottajalle).
+    Virhe talletetaan ja nostetaan raise_error():ssa; jonoa tyhjennetään silti,
+    jottei tuottaja jää jumiin täyteen jonoon.
+    """
+
+    def __init__(self, name: str, write: Callable[[List[Dict[str, Any]]], None], maxsize: int = 4) -> None:
+        self.q: "queue.Queue[Optional[List[Dict[str, Any]]]]" = queue.Queue(maxsize=maxsize)
+        self.write = write
+        self.error: Optional[BaseException] = None
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        while True:
+            recs = self.q.get()
+            if recs is None:
+                return
+            if self.error is None:
+                try:
+                    self.write(recs)
+                except BaseException as e:
+                    self.error = e
+
+    def put(self, recs: List[Dict[str, Any]]) -> None:
+        self.q.put(recs)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.q.put(None)
+            self.thread.join()
+
+    def raise_error(self) -> None:
+        if self.error is not None:
+            raise self.error
 
 
 def utc_ts() -> str:
@@ -83,19 +156,42 @@ def ensure_dir(p: Path) -> None:
     p.mkdir(parents=True, exist_ok=True)
 
 
-def compute_hash(path: Path, alg: str) -> Optional[str]:
+HASH_BUF_SIZE = 4 * 1024 * 1024
+
+
+def _new_sha256():
+    # Eheystarkiste, ei tietoturvakäyttö: FIPS-tilan OpenSSL ohittaa hyväksyntätarkistuksen
+    return hashlib.new("sha256", usedforsecurity=False)
+
+
+def _sha256_file_digest(f) -> str:
+    # Python 3.11+: read/update-silmukka ajetaan C:ssä
+    return hashlib.file_digest(f, _new_sha256).hexdigest()
+
+
+def _sha256_readinto(f) -> str:
+    # Vanhemmat Pythonit: yksi esivarattu puskuri, ei allokointia per lohko
+    h = _new_sha256()
+    buf = bytearray(HASH_BUF_SIZE)
+    view = memoryview(buf)
+    while True:
+        n = f.readinto(buf)
+        if not n:
+            break
+        h.update(view[:n])
+    return h.hexdigest()
+
+
+_sha256_fileobj = _sha256_file_digest if sys.version_info >= (3, 11) else _sha256_readinto
+
+
+def compute_hash(path: Union[bytes, str, Path], alg: str) -> Optional[str]:
     if alg == "none":
         return None
     if alg != "sha256":
         raise ValueError(f"Unsupported hash alg: {alg}")
-    h = hashlib.sha256()
-    with path.open("rb") as f:
-        while True:
-            b = f.read(1024 * 1024)
-            if not b:
-                break
-            h.update(b)
-    return h.hexdigest()
+    with open(path, "rb", buffering=0) as f:
+        return _sha256_fileobj(f)
 
 
 def has_st_birthtime() -> bool:
@@ -106,13 +202,13 @@ def has_st_birthtime() -> bool:
         return False
 
 
-def btime_from_stat_cmd(path: Path) -> Optional[float]:
+def btime_from_stat_cmd(path: Union[bytes, str, Path]) -> Optional[float]:
     """
     GNU coreutils: stat --printf=%W file  -> birth time as epoch seconds, 0 if unknown
     """
     try:
         out = subprocess.check_output(
-            ["stat", "--printf=%W", "--", str(path)],
+            ["stat", "--printf=%W", "--", os.fspath(path)],
             stderr=subprocess.DEVNULL,
         )
         s = out.decode("utf-8", "replace").strip()
@@ -126,7 +222,7 @@ def btime_from_stat_cmd(path: Path) -> Optional[float]:
         return None
 
 
-def get_btime(path: Path, st: os.stat_result, mode: str) -> Optional[float]:
+def get_btime(path: Union[bytes, str, Path], st: os.stat_result, mode: str) -> Optional[float]:
     if mode == "none":
         return None
     if mode == "auto":
@@ -142,25 +238,36 @@ def get_btime(path: Path, st: os.stat_result, mode: str) -> Optional[float]:
     raise ValueError(f"Unknown btime mode: {mode}")
 
 
-def iter_entries(root: Path, include_dirs: bool) -> Iterable[Tuple[Path, str, Optional[str]]]:
+def iter_entries(root: Path, include_dirs: bool,
+                 start: Optional[List[bytes]] = None,
+                 defer: Optional[List[bytes]] = None) -> Iterable[Tuple[bytes, Optional[os.DirEntry], str, Optional[bytes]]]:
     """
-    Yield (path, kind, link_target).
+    Yield (path, entry, kind, link_target); path and link_target are raw bytes.
     kind ∈ {"file","dir","symlink"}.
+    entry is the parent's scandir DirEntry (lstat cached on it), or None
+    for the root directory.
     Never follows symlinks, never traverses into symlinked dirs.
+    start: walk these directories (bytes paths under root) instead of root.
+    defer: collect root's subdirectories here instead of descending into them.
     """
-    stack = [root]
+    # bytes-root: scandir palauttaa polut byteinä, ei str<->bytes-muunnoksia
+    if start is None:
+        stack: List[Tuple[bytes, Optional[os.DirEntry]]] = [(fs_bytes(root), None)]
+    else:
+        stack = [(d, None) for d in reversed(start)]
 
     while stack:
-        d = stack.pop()
+        d, d_entry = stack.pop()
 
         # Optionally include the directory itself as an entry
+        # (hakemiston DirEntry kulkee pinossa, joten stat tulee sen välimuistista)
         if include_dirs:
-            yield (Path(d), "dir", None)
+            yield (d, d_entry, "dir", None)
 
         try:
             with os.scandir(d) as it:
                 for entry in it:
-                    p = Path(entry.path)
+                    p = entry.path
 
                     # Symlink: record, but do not traverse.
                     try:
@@ -169,7 +276,7 @@ def iter_entries(root: Path, include_dirs: bool) -> Iterable[Tuple[Path, str, Op
                                 target = os.readlink(p)
                             except OSError:
                                 target = None
-                            yield (p, "symlink", target)
+                            yield (p, entry, "symlink", target)
                             continue
                     except OSError:
                         # Can't even determine; skip.
@@ -178,7 +285,10 @@ def iter_entries(root: Path, include_dirs: bool) -> Iterable[Tuple[Path, str, Op
                     # Real directory (not symlink)
                     try:
                         if entry.is_dir(follow_symlinks=False):
-                            stack.append(p)
+                            if defer is not None and d_entry is None:
+                                defer.append(p)
+                            else:
+                                stack.append((p, entry))
                             continue
                     except OSError:
                         continue
@@ -186,7 +296,7 @@ def iter_entries(root: Path, include_dirs: bool) -> Iterable[Tuple[Path, str, Op
                     # Real file (not symlink)
                     try:
                         if entry.is_file(follow_symlinks=False):
-                            yield (p, "file", None)
+                            yield (p, entry, "file", None)
                     except OSError:
                         continue
 
@@ -194,8 +304,19 @@ def iter_entries(root: Path, include_dirs: bool) -> Iterable[Tuple[Path, str, Op
             continue
 
 
+ENTRIES_INSERT_SQL = """
+    INSERT INTO entries
+    (scan_id, path, path_b64, name, name_b64, kind, bytes, link_target, link_target_b64, link_len, mtime, ctime, btime, sha256)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
 def sqlite_set_pragmas(con: sqlite3.Connection, fast: bool) -> None:
     cur = con.cursor()
+    # page_size vaikuttaa vain ennen ensimmäistä taulua (ja ennen WAL:ia)
+    cur.execute("PRAGMA page_size=8192;")
+    # Yksi kirjoittaja: pidä lukko koko ajon ajan
+    cur.execute("PRAGMA locking_mode=EXCLUSIVE;")
     if fast:
         cur.execute("PRAGMA journal_mode=OFF;")
         cur.execute("PRAGMA synchronous=OFF;")
@@ -203,10 +324,17 @@ def sqlite_set_pragmas(con: sqlite3.Connection, fast: bool) -> None:
         cur.execute("PRAGMA journal_mode=WAL;")
         cur.execute("PRAGMA synchronous=NORMAL;")
     cur.execute("PRAGMA temp_store=MEMORY;")
+    cur.execute("PRAGMA cache_size=-262144;")     # 256 MiB
+    cur.execute("PRAGMA mmap_size=1073741824;")   # 1 GiB
+    # Älä valuta likaisia sivuja levylle kesken transaktion (välimuisti riittää)
+    cur.execute("PRAGMA cache_spill=OFF;")
     con.commit()
 
 
-def sqlite_init(con: sqlite3.Connection) -> None:
+def sqlite_init_schema(con: sqlite3.Connection) -> None:
+    """
+    Taulut ilman sekundaari-indeksejä (ne luodaan vasta latauksen jälkeen).
+    """
     cur = con.cursor()
     cur.execute("""
     CREATE TABLE IF NOT EXISTS scans (
@@ -243,10 +371,6 @@ def sqlite_init(con: sqlite3.Connection) -> None:
       PRIMARY KEY (scan_id, path)
     );
     """)
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_entries_name ON entries(name);")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_entries_mtime ON entries(mtime);")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_entries_sha256 ON entries(sha256);")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_entries_link_target ON entries(link_target);")
     con.commit()
     # Backfill columns if DB already existed without them
     try:
@@ -264,6 +388,288 @@ def sqlite_init(con: sqlite3.Connection) -> None:
     con.commit()
 
 
+def sqlite_finalize_indexes(con: sqlite3.Connection) -> None:
+    """
+    Sekundaari-indeksit kerralla bulk-latauksen jälkeen (yksi lajittelu per indeksi).
+    """
+    cur = con.cursor()
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_entries_name ON entries(name);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_entries_mtime ON entries(mtime);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_entries_sha256 ON entries(sha256);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_entries_link_target ON entries(link_target);")
+
+
+def scan_entries(opt: Options, walk: Iterable[Tuple[bytes, Optional[os.DirEntry], str, Optional[bytes]]],
+                 scan_id: int, ts: str, started: float,
+                 con: sqlite3.Connection, gz: gzip.GzipFile, errf: Any, label: str = "") -> Tuple[int, int, int, int]:
+    """
+    Käy walkerin tuottamat entryt läpi ja kirjoita ne gz-JSONL:ään ja entries-tauluun.
+    Palauttaa (count, files, dirs, syms).
+    """
+    cur = con.cursor()
+    disk_id = opt.disk_id
+
+    def log_err(kind: str, path: bytes, msg: str) -> None:
+        errf.write(b"%s\t%s\t%s\n" % (kind.encode("ascii"), path, msg.encode("utf-8", "replace")))
+
+    batch: List[Dict[str, Any]] = []
+    BATCH_N = 20000
+    # Yksi transaktio; commit vain joka COMMIT_EVERY rivin jälkeen (kaatumisikkuna)
+    COMMIT_EVERY = 100000
+    uncommitted = 0
+
+    # Hashaus säikeissä (hashlib vapauttaa GIL:n); tulokset kirjoitetaan
+    # lähetysjärjestyksessä, ja jono on rajattu jotta muisti pysyy tasaisena.
+    pool = ThreadPoolExecutor(max_workers=opt.hash_jobs) if opt.hash_alg != "none" else None
+    pending: Deque[Tuple[Dict[str, Any], Optional[Future], bytes]] = deque()
+    max_pending = 2 * opt.hash_jobs
+
+    # Kirjoittajat (säikeet, erä kerrallaan; tietueita ei muuteta enää jonoon laiton jälkeen)
+    def write_json(recs: List[Dict[str, Any]]) -> None:
+        if opt.json_pretty:
+            # surrogateescape palauttaa ei-UTF-8-nimet alkuperäisiksi tavuiksi
+            lines = [json.dumps(rec, ensure_ascii=False, indent=2).encode("utf-8", "surrogateescape") for rec in recs]
+        else:
+            lines = [json_line(rec) for rec in recs]
+        lines.append(b"")
+        gz.write(b"\n".join(lines))
+
+    def write_db(recs: List[Dict[str, Any]]) -> None:
+        nonlocal uncommitted
+        # Generaattori: rivituplet syntyvät sitä mukaa kuin sqlite3 kuluttaa niitä
+        cur.executemany(ENTRIES_INSERT_SQL, (
+            (scan_id, r["path"], r["path_b64"], r["name"], r["name_b64"], r["kind"],
+             r["bytes"], r["link_target"], r["link_target_b64"], r["link_len"],
+             r["mtime"], r["ctime"], r["btime"], r["sha256"]) for r in recs))
+        uncommitted += len(recs)
+        if uncommitted >= COMMIT_EVERY:
+            cur.execute("COMMIT")
+            cur.execute("BEGIN IMMEDIATE")
+            uncommitted = 0
+
+    gz_writer = BatchWriter("manifest-jsonl", write_json)
+    db_writer = BatchWriter("manifest-sqlite", write_db)
+
+    def flush_batch() -> None:
+        nonlocal batch
+        gz_writer.put(batch)
+        db_writer.put(batch)
+        batch = []
+
+    def emit(rec: Dict[str, Any], fut: Optional[Future], p: bytes) -> None:
+        if fut is not None:
+            try:
+                rec["sha256"] = fut.result()
+            except OSError as e:
+                log_err("HASH_FAIL", p, repr(e))
+        batch.append(rec)
+        if len(batch) >= BATCH_N:
+            flush_batch()
+
+    root_prefix = root_prefix_bytes(opt.root)
+    # Vakiot koko skannauksen ajan
+    root_txt = fs_safe_text(str(opt.root))
+    root_b64 = b64_bytes(fs_bytes(opt.root))
+
+    count = 0
+    files = 0
+    dirs = 0
+    syms = 0
+
+    # Paikalliset aliakset kuumaan silmukkaan (LOAD_FAST vs LOAD_GLOBAL/attr)
+    _stat = os.stat
+    _isreg = statmod.S_ISREG
+    _isdir = statmod.S_ISDIR
+    _islnk = statmod.S_ISLNK
+    _basename = os.path.basename
+    _float = float
+    _int = int
+    _b64 = b64_bytes
+    _fsdisp = fs_display_from_bytes
+    _relb = rel_path_bytes
+    _get_btime = get_btime
+    _now = time.time
+    _append = pending.append
+    _popleft = pending.popleft
+    hash_alg = opt.hash_alg
+    btime_mode = opt.btime_mode
+    progress_every = opt.progress_every
+
+    # Autocommit-yhteys (isolation_level=None): transaktiot käsin
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        for p, entry, kind, link_target in walk:
+            count += 1
+
+            # Always lstat: never follow symlinks (scandir has it cached for entries)
+            try:
+                st = entry.stat(follow_symlinks=False) if entry is not None else _stat(p, follow_symlinks=False)
+            except OSError as e:
+                log_err("STAT_FAIL", p, repr(e))
+                continue
+
+            mode = st.st_mode
+
+            # Classify safely by st_mode
+            if kind == "dir":
+                if not _isdir(mode):
+                    continue
+                size = None
+                sha = None
+                link_len = None
+                dirs += 1
+
+            elif kind == "file":
+                if not _isreg(mode):
+                    # skip non-regular files (fifo, socket, device, etc.)
+                    continue
+                size = _int(st.st_size)
+                link_len = None
+                sha = None
+                files += 1
+
+            elif kind == "symlink":
+                if not _islnk(mode):
+                    continue
+                size = None  # avoid confusion: symlink does not have "target file size"
+                sha = None
+                link_len = _int(st.st_size) if st.st_size is not None else None
+                syms += 1
+
+            else:
+                continue
+
+            mtime = _float(st.st_mtime)
+            ctime = _float(st.st_ctime)
+            btime = _get_btime(p, st, btime_mode)
+
+            path_rel_b = _relb(p, root_prefix)
+            path_txt = _fsdisp(path_rel_b)
+            path_b64 = _b64(path_rel_b)
+
+            name_b = _basename(path_rel_b) if path_rel_b not in (b"", b".") else _basename(p)
+            name_txt = _fsdisp(name_b)
+            name_b64 = _b64(name_b)
+
+            # symlink target: tee se mieluummin byteinä suoraan, jotta et saa surrogaatteja
+            target_txt = None
+            target_b64 = None
+            # (walker luki sen jo bytes-polulla, joten readlink palautti bytes)
+            if kind == "symlink" and link_target is not None:
+                target_txt = _fsdisp(link_target)
+                target_b64 = _b64(link_target)
+
+            rec = {
+                "disk_id": disk_id,
+                "root": root_txt,
+                "root_b64": root_b64,
+                "scan_started_utc": ts,
+                "path": path_txt,                      # <-- RELATIIVINEN
+                "path_b64": path_b64,
+                "name": name_txt,
+                "name_b64": name_b64,
+                "kind": kind,
+                "bytes": size,
+                "link_target": target_txt,
+                "link_target_b64": target_b64,
+                "link_len": link_len,
+                "mtime": mtime,
+                "ctime": ctime,
+                "btime": btime,
+                "sha256": sha,
+            }
+            fut = pool.submit(compute_hash, p, hash_alg) if pool is not None and kind == "file" else None
+            _append((rec, fut, p))
+            while len(pending) > max_pending:
+                emit(*_popleft())
+
+            if progress_every and (count % progress_every == 0):
+                elapsed = _now() - started
+                print(f"{label}{count} entries ({files} files, {dirs} dirs, {syms} symlinks) in {elapsed:.1f}s ...",
+                      file=sys.stderr)
+
+        while pending:
+            emit(*pending.popleft())
+        if batch:
+            flush_batch()
+        gz_writer.close()
+        db_writer.close()
+        gz_writer.raise_error()
+        db_writer.raise_error()
+        cur.execute("COMMIT")
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        gz_writer.close()
+        db_writer.close()
+    return count, files, dirs, syms
+
+
+def add_counts(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+    return (a[0] + b[0], a[1] + b[1], a[2] + b[2], a[3] + b[3])
+
+
+def part_paths(opt: Options, ts: str, k: int) -> Tuple[Path, Path, Path]:
+    base = f"manifest_{opt.disk_id}_{ts}_part{k}"
+    return (opt.outdir / f"{base}.jsonl.gz", opt.outdir / f"{base}.sqlite", opt.outdir / f"{base}.errors.log")
+
+
+def scan_part(task: Tuple[Options, int, List[bytes], int, str, float]) -> Tuple[Tuple[int, int, int, int], str, str, str]:
+    """
+    Worker-prosessi: skannaa annetut juuren alihakemistot omiin osatiedostoihinsa.
+    """
+    opt, k, tops, scan_id, ts, started = task
+    json_path, sql_path, err_path = part_paths(opt, ts, k)
+    con = sqlite3.connect(str(sql_path), isolation_level=None, check_same_thread=False)
+    try:
+        # Väliaikainen osa: ei journalia, indeksit vasta lopullisessa kannassa
+        sqlite_set_pragmas(con, True)
+        sqlite_init_schema(con)
+        with err_path.open("wb", buffering=1 << 20) as errf, \
+                gzip.GzipFile(str(json_path), "wb", compresslevel=6) as gz:
+            walk = iter_entries(opt.root, opt.include_dirs, start=tops)
+            counts = scan_entries(opt, walk, scan_id, ts, started, con, gz, errf, label=f"[part {k}] ")
+    finally:
+        con.close()
+    return counts, str(json_path), str(sql_path), str(err_path)
+
+
+def scan_parallel(opt: Options, subdirs: List[bytes], scan_id: int, ts: str, started: float,
+                  con: sqlite3.Connection, jsonf: Any, errf: Any, part_files: List[str]) -> Tuple[int, int, int, int]:
+    """
+    Jaa juuren alihakemistot opt.walk_jobs prosessille ja yhdistä osat:
+    gzip-jäsenet liitetään JSONL-tiedoston perään, rivit ATTACH + INSERT ... SELECT.
+    """
+    counts = (0, 0, 0, 0)
+    n = min(opt.walk_jobs, len(subdirs))
+    if n == 0:
+        return counts
+    # Hash-säikeet jaetaan prosessien kesken
+    part_opt = replace(opt, hash_jobs=max(1, opt.hash_jobs // n))
+    tasks = [(part_opt, k, subdirs[k::n], scan_id, ts, started) for k in range(n)]
+    for k in range(n):
+        part_files.extend(str(p) for p in part_paths(opt, ts, k))
+
+    cur = con.cursor()
+    with multiprocessing.Pool(n) as mp:
+        for part_counts, json_part, sql_part, err_part in mp.imap(scan_part, tasks):
+            with open(json_part, "rb") as f:
+                shutil.copyfileobj(f, jsonf, 1 << 20)
+            with open(err_part, "rb") as f:
+                shutil.copyfileobj(f, errf, 1 << 20)
+            # ATTACH/DETACH transaktion ulkopuolella; INSERT ... SELECT on oma transaktionsa
+            cur.execute("ATTACH DATABASE ? AS part", (sql_part,))
+            cur.execute("""
+                INSERT INTO main.entries
+                SELECT * FROM part.entries
+            """)
+            cur.execute("DETACH DATABASE part")
+            for f in (json_part, sql_part, err_part):
+                os.remove(f)
+            counts = add_counts(counts, part_counts)
+    return counts
+
+
 def main() -> int:
     ap = argparse.ArgumentParser(
         description="Create file manifest as JSONL.gz + SQLite. Symlinks recorded, never followed."
@@ -283,6 +689,10 @@ def main() -> int:
     ap.add_argument("--json-pretty", action="store_true", help="Pretty JSON (bigger files)")
     ap.add_argument("--progress-every", type=int, default=20000,
                     help="Print progress every N entries (default: 20000)")
+    ap.add_argument("--hash-jobs", type=int, default=0,
+                    help="Hash N files in parallel threads (default: 0 = CPU count)")
+    ap.add_argument("--walk-jobs", type=int, default=1,
+                    help="Walk root's subdirectories in N processes (default: 1; 0 = CPU count)")
     args = ap.parse_args()
 
     disk_id = args.disk_id
@@ -310,6 +720,8 @@ def main() -> int:
         sqlite_fast=args.sqlite_fast,
         json_pretty=args.json_pretty,
         progress_every=max(1, args.progress_every),
+        hash_jobs=args.hash_jobs if args.hash_jobs > 0 else (os.cpu_count() or 1),
+        walk_jobs=args.walk_jobs if args.walk_jobs > 0 else (os.cpu_count() or 1),
     )
 
     if opt.btime_mode == "auto" and not has_st_birthtime():
@@ -322,9 +734,11 @@ def main() -> int:
     user = getpass.getuser()
     plat = platform.platform()
 
-    con = sqlite3.connect(str(sql_path))
+    # SQLite-kirjoitukset tehdään writer-säikeessä (ei koskaan samanaikaisesti pääsäikeen kanssa).
+    # isolation_level=None: ei sqlite3-moduulin implisiittistä BEGINiä, transaktiot käsin.
+    con = sqlite3.connect(str(sql_path), isolation_level=None, check_same_thread=False)
     sqlite_set_pragmas(con, opt.sqlite_fast)
-    sqlite_init(con)
+    sqlite_init_schema(con)
     cur = con.cursor()
     cur.execute("""
         INSERT INTO scans(disk_id, root, started_utc, host, user, platform, hash_alg,
@@ -337,159 +751,46 @@ def main() -> int:
         "manifest.py/2",
     ))
     scan_id = cur.lastrowid
-    con.commit()
-
-    errf = err_path.open("w", encoding="utf-8", errors="replace")
-    gz = gzip.open(str(json_path), "wt", encoding="utf-8", errors="surrogateescape", newline="\n", compresslevel=9)
 
-    def log_err(kind: str, path: Path, msg: str) -> None:
-        errf.write(f"{kind}\t{fs_safe_text(str(path))}\t{msg}\n")
-
-    batch = []
-    BATCH_N = 2000
-
-    count = 0
-    files = 0
-    dirs = 0
-    syms = 0
+    # Bytes-tila: walkerin polut kirjoitetaan sellaisenaan, ilman str-kierrosta
+    errf = err_path.open("wb", buffering=1 << 20)
+    # Binääritila + koottu kirjoitus per erä; taso 6 (9 maksaa paljon CPU:ta lähes turhaan).
+    # Oma tiedostokahva, jotta rinnakkaisajon osien gzip-jäsenet voi liittää perään.
+    jsonf = json_path.open("wb")
+    gz = gzip.GzipFile(fileobj=jsonf, mode="wb", compresslevel=6)
+    part_files: List[str] = []
 
     try:
-        for p, kind, link_target in iter_entries(opt.root, opt.include_dirs):
-            count += 1
-            name = p.name
-
-            # Always lstat: never follow symlinks
-            try:
-                st = os.stat(p, follow_symlinks=False)
-            except OSError as e:
-                log_err("STAT_FAIL", p, repr(e))
-                continue
-
-            mode = st.st_mode
-
-            # Classify safely by st_mode
-            if kind == "dir":
-                if not statmod.S_ISDIR(mode):
-                    continue
-                size = None
-                sha = None
-                link_len = None
-                dirs += 1
-
-            elif kind == "file":
-                if not statmod.S_ISREG(mode):
-                    # skip non-regular files (fifo, socket, device, etc.)
-                    continue
-                size = int(st.st_size)
-                link_len = None
-                sha = None
-                if opt.hash_alg != "none":
-                    try:
-                        sha = compute_hash(p, opt.hash_alg)
-                    except OSError as e:
-                        log_err("HASH_FAIL", p, repr(e))
-                        sha = None
-                files += 1
-
-            elif kind == "symlink":
-                if not statmod.S_ISLNK(mode):
-                    continue
-                size = None  # avoid confusion: symlink does not have "target file size"
-                sha = None
-                link_len = int(st.st_size) if st.st_size is not None else None
-                syms += 1
-
-            else:
-                continue
-
-            mtime = float(st.st_mtime)
-            ctime = float(st.st_ctime)
-            btime = get_btime(p, st, opt.btime_mode)
-
-            path_rel_b = rel_path_bytes(p, opt.root)
-            path_txt = fs_display_from_bytes(path_rel_b)
-            path_b64 = b64_bytes(path_rel_b)
-
-            name_b = os.path.basename(path_rel_b) if path_rel_b not in (b"", b".") else os.path.basename(fs_bytes(p))
-            name_txt = fs_display_from_bytes(name_b)
-            name_b64 = b64_bytes(name_b)
-
-            # symlink target: tee se mieluummin byteinä suoraan, jotta et saa surrogaatteja
-            target_txt = None
-            target_b64 = None
-            if kind == "symlink":
-                try:
-                    target_b = os.readlink(fs_bytes(p))  # bytes in
-                    if isinstance(target_b, str):
-                        target_txt = fs_safe_text(target_b)
-                        target_b64 = b64_bytes(os.fsencode(target_b))
-                    else:
-                        target_txt = fs_display_from_bytes(target_b)
-                        target_b64 = b64_bytes(target_b)
-                except OSError:
-                    target_txt = None
-                    target_b64 = None
-
-            rec = {
-                "disk_id": opt.disk_id,
-                "root": fs_safe_text(str(opt.root)),
-                "root_b64": b64_bytes(fs_bytes(opt.root)),
-                "scan_started_utc": ts,
-                "path": path_txt,                      # <-- RELATIIVINEN
-                "path_b64": path_b64,
-                "name": name_txt,
-                "name_b64": name_b64,
-                "kind": kind,
-                "bytes": size,
-                "link_target": target_txt,
-                "link_target_b64": target_b64,
-                "link_len": link_len,
-                "mtime": mtime,
-                "ctime": ctime,
-                "btime": btime,
-                "sha256": sha,
-            }
-            if opt.json_pretty:
-                gz.write(json.dumps(rec, ensure_ascii=False, indent=2) + "\n")
-            else:
-                gz.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
-
-            batch.append((scan_id, path_txt, path_b64, name_txt, name_b64, kind, size, target_txt, target_b64, link_len, mtime, ctime, btime, sha))
-
-            if len(batch) >= BATCH_N:
-                cur.executemany("""
-                    INSERT OR REPLACE INTO entries
-                    (scan_id, path, path_b64, name, name_b64, kind, bytes, link_target, link_target_b64, link_len, mtime, ctime, btime, sha256)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, batch)
-                con.commit()
-                batch.clear()
-
-            if opt.progress_every and (count % opt.progress_every == 0):
-                elapsed = time.time() - started
-                print(f"{count} entries ({files} files, {dirs} dirs, {syms} symlinks) in {elapsed:.1f}s ...",
-                      file=sys.stderr)
-
-        if batch:
-            cur.executemany("""
-                INSERT OR REPLACE INTO entries
-                (scan_id, path, path_b64, name, name_b64, kind, bytes, link_target, link_target_b64, link_len, mtime, ctime, btime, sha256)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, batch)
-            con.commit()
-            batch.clear()
-
+        if opt.walk_jobs > 1:
+            # Juuren omat entryt tässä prosessissa, alihakemistot workereille
+            subdirs: List[bytes] = []
+            counts = scan_entries(opt, iter_entries(opt.root, opt.include_dirs, defer=subdirs),
+                                  scan_id, ts, started, con, gz, errf)
+            gz.close()
+            counts = add_counts(counts, scan_parallel(opt, subdirs, scan_id, ts, started,
+                                                      con, jsonf, errf, part_files))
+        else:
+            counts = scan_entries(opt, iter_entries(opt.root, opt.include_dirs),
+                                  scan_id, ts, started, con, gz, errf)
+        count, files, dirs, syms = counts
+        cur.execute("BEGIN IMMEDIATE")
+        sqlite_finalize_indexes(con)
         finished = utc_ts()
         cur.execute("UPDATE scans SET finished_utc=? WHERE scan_id=?", (finished, scan_id))
-        con.commit()
+        cur.execute("COMMIT")
 
     finally:
         try: gz.close()
         except Exception: pass
+        try: jsonf.close()
+        except Exception: pass
         try: errf.close()
         except Exception: pass
         try: con.close()
         except Exception: pass
+        for f in part_files:
+            try: os.remove(f)
+            except OSError: pass
 
     elapsed = time.time() - started
     print(f"Wrote: {json_path}")
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import json
 import os
 from pathlib import Path
@@ -11,7 +12,11 @@ AI_CONFIG_PATH = CONFIG_DIR / "ai.json"
 DEFAULT_DB_NAME = "aeternitas.db"
 
 
+@functools.lru_cache(maxsize=1)
 def load_config() -> Dict[str, Any]:
+    """
+    Read once per process; treat the returned dict as read-only.
+    """
     if not CONFIG_PATH.exists():
         return {}
     try:
@@ -24,7 +29,8 @@ def resolve_db_path(cli_db: Optional[str]) -> Path:
     if cli_db:
         return Path(cli_db)
     try:
-        CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+        if not CONFIG_DIR.exists():
+            CONFIG_DIR.mkdir(parents=True, exist_ok=True)
     except Exception:
         pass
     cfg = load_config()
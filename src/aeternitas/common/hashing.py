@@ -1,12 +1,47 @@
 from __future__ import annotations
 
 import hashlib
+import mmap
+import os
 from pathlib import Path
 
+# Above this size, hash straight from a read-only mapping (no user-space copy).
+MMAP_HASH_MIN_SIZE = 64 * 1024 * 1024
+
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _new_sha256(data: bytes = b""):
+    # Content addressing, not security: skips FIPS-mode approval checks in OpenSSL.
+    return hashlib.new("sha256", data, usedforsecurity=False)
+
+
+def _advise_sequential(fd: int) -> None:
+    """
+    Ask the kernel for a larger readahead window and early prefetch (Linux).
+    No DONTNEED afterwards: ingest extracts text from the same file next.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+
 
 def sha256_file(path: Path) -> str:
-    h = hashlib.sha256()
-    with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+    with path.open("rb", buffering=0) as f:
+        fd = f.fileno()
+        _advise_sequential(fd)
+        if os.fstat(fd).st_size >= MMAP_HASH_MIN_SIZE:
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                return _new_sha256(mm).hexdigest()
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, _new_sha256).hexdigest()
+        h = _new_sha256()
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
             h.update(chunk)
-    return h.hexdigest()
+        return h.hexdigest()
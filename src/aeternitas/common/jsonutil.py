@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Union
+
+# Optional: orjson serializes several times faster than the stdlib
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
+
+def json_dumps(obj: Any) -> str:
+    """
+    Compact JSON text with non-ASCII kept as-is (orjson when installed).
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def json_loads(data: Union[str, bytes]) -> Any:
+    """
+    json.loads, through orjson when installed.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
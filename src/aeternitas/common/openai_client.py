@@ -1,17 +1,90 @@
 from __future__ import annotations
 
-import json
+import base64
+import http.client
 import sys
+import threading
 import time
-import urllib.error
+import urllib.parse
 import urllib.request
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from aeternitas.common.jsonutil import json_dumps, json_loads
+
+API_HOST = "api.openai.com"
+RESPONSES_PATH = "/v1/responses"
+REQUEST_TIMEOUT = 120
+
+# One keep-alive HTTPS connection per thread: repeated calls skip the TCP/TLS handshake.
+_tls = threading.local()
+
+# Errors meaning a reused keep-alive connection was closed by the server while idle.
+_STALE_CONN_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
 
 
 class OpenAIError(RuntimeError):
     pass
 
 
+def _drop_connection() -> None:
+    conn = getattr(_tls, "conn", None)
+    _tls.conn = None
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _new_connection() -> http.client.HTTPSConnection:
+    """
+    HTTPS connection to API_HOST, through a CONNECT tunnel when HTTPS_PROXY
+    applies (NO_PROXY honored), like urllib.request.urlopen does.
+    """
+    proxy = None if urllib.request.proxy_bypass(API_HOST) else urllib.request.getproxies().get("https")
+    if not proxy:
+        return http.client.HTTPSConnection(API_HOST, timeout=REQUEST_TIMEOUT)
+    u = urllib.parse.urlsplit(proxy if "://" in proxy else "http://" + proxy)
+    tunnel_headers: Dict[str, str] = {}
+    if u.username is not None:
+        cred = f"{urllib.parse.unquote(u.username)}:{urllib.parse.unquote(u.password or '')}"
+        tunnel_headers["Proxy-Authorization"] = "Basic " + base64.b64encode(cred.encode("utf-8")).decode("ascii")
+    # Same default port as urllib: the proxy host goes to HTTPSConnection as is
+    proxy_host = u.netloc.rpartition("@")[2]
+    conn = http.client.HTTPSConnection(proxy_host, timeout=REQUEST_TIMEOUT)
+    conn.set_tunnel(API_HOST, headers=tunnel_headers)
+    return conn
+
+
+def _post(path: str, data: bytes, headers: Dict[str, str]) -> Tuple[int, str]:
+    """
+    POST over this thread's keep-alive connection; returns (status, body).
+    A stale reused connection is reopened once, without counting as a retry.
+    """
+    for _ in range(2):
+        conn = getattr(_tls, "conn", None)
+        reused = conn is not None
+        if conn is None:
+            conn = _new_connection()
+            _tls.conn = conn
+        try:
+            conn.request("POST", path, body=data, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read().decode("utf-8")
+        except _STALE_CONN_ERRORS:
+            _drop_connection()
+            if reused:
+                continue
+            raise
+        except Exception:
+            _drop_connection()
+            raise
+        if resp.will_close:
+            _drop_connection()
+        return resp.status, body
+    raise OpenAIError("OpenAI request failed: connection closed")
+
+
 def call_openai_responses(
     api_key: str,
     model: str,
@@ -21,7 +94,6 @@ def call_openai_responses(
     max_retries: int = 5,
     base_delay: float = 1.0,
 ) -> str:
-    url = "https://api.openai.com/v1/responses"
     payload: Dict[str, Any] = {
         "model": model,
         "input": input_text,
@@ -30,39 +102,16 @@ def call_openai_responses(
     if max_output_tokens is not None:
         payload["max_output_tokens"] = max_output_tokens
 
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        data=data,
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        method="POST",
-    )
+    data = json_dumps(payload).encode("utf-8")
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
 
     last_err: Optional[Exception] = None
     for attempt in range(max_retries + 1):
         try:
-            with urllib.request.urlopen(req, timeout=120) as resp:
-                body = resp.read().decode("utf-8")
-            last_err = None
-            break
-        except urllib.error.HTTPError as e:
-            last_err = e
-            if e.code in (429, 500, 502, 503, 504) and attempt < max_retries:
-                delay = base_delay * (2 ** attempt)
-                print(f"[openai] HTTP {e.code}, retrying in {delay:.1f}s...", file=sys.stderr, flush=True)
-                time.sleep(delay)
-                continue
-            try:
-                body = e.read().decode("utf-8")
-            except Exception:
-                body = ""
-            msg = f"OpenAI request failed: HTTP {e.code}"
-            if body:
-                msg += f" | {body}"
-            raise OpenAIError(msg) from e
+            status, body = _post(RESPONSES_PATH, data, headers)
         except Exception as e:
             last_err = e
             if attempt < max_retries:
@@ -71,12 +120,25 @@ def call_openai_responses(
                 time.sleep(delay)
                 continue
             raise OpenAIError(f"OpenAI request failed: {e}") from e
+        if 200 <= status < 300:
+            last_err = None
+            break
+        last_err = OpenAIError(f"HTTP {status}")
+        if status in (429, 500, 502, 503, 504) and attempt < max_retries:
+            delay = base_delay * (2 ** attempt)
+            print(f"[openai] HTTP {status}, retrying in {delay:.1f}s...", file=sys.stderr, flush=True)
+            time.sleep(delay)
+            continue
+        msg = f"OpenAI request failed: HTTP {status}"
+        if body:
+            msg += f" | {body}"
+        raise OpenAIError(msg)
 
     if last_err is not None:
         raise OpenAIError(f"OpenAI request failed: {last_err}")
 
     try:
-        obj = json.loads(body)
+        obj = json_loads(body)
     except Exception as e:
         raise OpenAIError("OpenAI response was not valid JSON") from e
 
@@ -4,26 +4,45 @@ import re
 from pathlib import Path
 from typing import Optional, Tuple
 
+_YEAR_RE = re.compile(r"(19|20)\d{2}")
+
 
 def guess_encoding(data: bytes) -> str:
+    return decode_text(data)[1]
+
+
+def decode_text(data: bytes) -> Tuple[str, str]:
+    """
+    Decode once: UTF-8 (BOM stripped) if valid, else latin-1 (never fails).
+    Returns (text, encoding).
+    """
+    if data[:3] == b"\xef\xbb\xbf":
+        try:
+            return data[3:].decode("utf-8"), "utf-8-sig"
+        except UnicodeDecodeError:
+            pass
     try:
-        data.decode("utf-8")
-        return "utf-8"
+        return data.decode("utf-8"), "utf-8"
     except UnicodeDecodeError:
-        return "latin-1"
+        return data.decode("latin-1"), "latin-1"
 
 
 def safe_read_text(path: Path) -> Tuple[str, str]:
-    data = path.read_bytes()
-    enc = guess_encoding(data)
-    text = data.decode(enc, errors="replace")
-    return text, enc
+    return decode_text(path.read_bytes())
 
 
 def normalize_ws(s: str) -> str:
-    return re.sub(r"[ \t]+", " ", s).strip()
+    """
+    Collapse runs of spaces/tabs into one space and strip. Newlines are kept,
+    so multi-line snippets stay multi-line. Plain str ops; no regex.
+    """
+    if "\t" in s:
+        s = s.replace("\t", " ")
+    if "  " in s:
+        s = " ".join(filter(None, s.split(" ")))
+    return s.strip()
 
 
 def infer_year_from_path(path: Path) -> Optional[int]:
-    m = re.search(r"(19|20)\d{2}", path.name)
+    m = _YEAR_RE.search(path.name)
     return int(m.group(0)) if m else None
@@ -1,29 +1,60 @@
 from __future__ import annotations
 
 import argparse
+import os
 import sys
 from pathlib import Path
 
 from aeternitas.common.config import resolve_db_path
-from aeternitas.index.db.connection import db_connect
-from aeternitas.index.ingest.ingest import ingest_file
-from aeternitas.index.timeline.build import rebuild_timeline
-from aeternitas.index.narrate import narrate
+
+# search: FTS-ehdokkaita haetaan limit * SEARCH_OVERFETCH ennen status-/revisiosuodatusta
+SEARCH_OVERFETCH = 5
+
+# Alikomentojen toteutukset tuodaan vasta cmd_*-funktioissa: --help, search ja
+# timeline eivät lataa ingest-putkea (process pool, parserit) eivätkä HTTP-asiakasta.
 
 
 def cmd_ingest(args: argparse.Namespace) -> None:
+    from aeternitas.index.db.connection import db_connect_writer, drop_fts_triggers, repair_fts, restore_fts_triggers
+    from aeternitas.index.ingest.ingest import ingest_files
+    from aeternitas.index.timeline.build import rebuild_timeline
+
     db = resolve_db_path(args.db)
-    con = db_connect(db)
+    con = db_connect_writer(db)
     scan_root = Path(args.scan_root).resolve() if args.scan_root else None
-    with con:
-        for p in args.paths:
-            ingest_file(con, Path(p), scan_root=scan_root)
-        rebuild_timeline(con)
+    if args.fast:
+        con.execute("PRAGMA synchronous=OFF")
+    if args.bulk:
+        drop_fts_triggers(con)
+    else:
+        # Per-row FTS needs the triggers: restore them unless a bulk run is verifiably live
+        repair_fts(con, force_unverified=True)
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            ingest_files(
+                con,
+                (Path(p) for p in args.paths),
+                scan_root=scan_root,
+                verify=args.verify,
+                jobs=args.jobs or os.cpu_count() or 1,
+            )
+            rebuild_timeline(con)
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+    finally:
+        if args.bulk:
+            restore_fts_triggers(con)
+    con.execute("PRAGMA optimize")
     print(f"OK: ingest + timeline -> {db}")
 
 
 def cmd_timeline(args: argparse.Namespace) -> None:
-    con = db_connect(resolve_db_path(args.db))
+    from aeternitas.index.db.connection import db_connect_reader
+
+    con = db_connect_reader(resolve_db_path(args.db))
     q = "SELECT date, kind, title, snippet FROM timeline ORDER BY date LIMIT ?"
     rows = con.execute(q, (args.limit,)).fetchall()
     for r in rows:
@@ -34,24 +65,53 @@ def cmd_timeline(args: argparse.Namespace) -> None:
 
 
 def cmd_search(args: argparse.Namespace) -> None:
-    con = db_connect(resolve_db_path(args.db))
+    from aeternitas.index.db.connection import db_connect_reader, fts_triggers_missing
+
+    con = db_connect_reader(resolve_db_path(args.db))
+    if fts_triggers_missing(con):
+        print(
+            "[search] Warning: full-text index may be stale (ingest --bulk running or interrupted)",
+            file=sys.stderr,
+            flush=True,
+        )
+    # MATCH erillään CTE:ssä: FTS5-indeksi rajaa ehdokkaat (bm25-järjestyksessä)
+    # ennen liitoksia; ylihaku kattaa vanhat revisiot ja virherivit.
+    # snippet() käy koko tekstin läpi, joten se lasketaan vasta lopullisille
+    # riveille (top), ei jokaiselle osumalle ennen järjestystä.
     q = """
-    SELECT d.title, snippet(doc_fts, 1, '[', ']', '…', 12) AS snip
-    FROM doc_fts
-    JOIN doc d ON d.id = doc_fts.rowid
-    JOIN revision r ON r.id = d.revision_id
-    JOIN source s ON s.current_revision_id = r.id
-    WHERE doc_fts MATCH ?
-      AND r.status = 'ok'
-    LIMIT ?
+    WITH hits AS (
+        SELECT rowid AS doc_id, bm25(doc_fts) AS score
+        FROM doc_fts
+        WHERE doc_fts MATCH ?1
+        ORDER BY score
+        LIMIT ?2
+    ),
+    top AS MATERIALIZED (
+        SELECT hits.doc_id, hits.score, d.title
+        FROM hits
+        JOIN doc d ON d.id = hits.doc_id
+        JOIN revision r ON r.id = d.revision_id
+        JOIN source s ON s.current_revision_id = r.id
+        WHERE r.status = 'ok'
+        ORDER BY hits.score
+        LIMIT ?3
+    )
+    SELECT top.title, snippet(doc_fts, 1, '[', ']', '…', 12) AS snip
+    FROM top
+    JOIN doc_fts ON doc_fts.rowid = top.doc_id
+    WHERE doc_fts MATCH ?1
+    ORDER BY top.score
     """
-    rows = con.execute(q, (args.query, args.limit)).fetchall()
+    rows = con.execute(q, (args.query, args.limit * SEARCH_OVERFETCH, args.limit)).fetchall()
     for r in rows:
         print(f"- {r['title']}: {r['snip']}")
 
 
 def cmd_narrate(args: argparse.Namespace) -> None:
-    con = db_connect(resolve_db_path(args.db))
+    from aeternitas.index.db.connection import db_connect_reader
+    from aeternitas.index.narrate import narrate
+
+    con = db_connect_reader(resolve_db_path(args.db))
     narrative, _summaries = narrate(
         con,
         date_from=args.date_from,
@@ -59,6 +119,7 @@ def cmd_narrate(args: argparse.Namespace) -> None:
         model=args.model,
         max_chars=args.max_chars,
         delay_seconds=args.delay_seconds,
+        concurrency=args.concurrency,
     )
     if args.out:
         Path(args.out).write_text(narrative, encoding="utf-8")
@@ -72,8 +133,12 @@ def build_parser() -> argparse.ArgumentParser:
 
     p_ing = sub.add_parser("ingest", help="Ingestoi tiedostot ja rakentaa aikajanan")
     p_ing.add_argument("--db", dest="db", default=None, help="SQLite-tiedosto (optionaalinen, muuten config)")
-    p_ing.add_argument("paths", nargs="+", help="Tiedostopolut")
+    p_ing.add_argument("paths", nargs="+", help="Tiedosto- tai hakemistopolut (hakemistot käydään läpi rekursiivisesti)")
     p_ing.add_argument("--scan-root", dest="scan_root", help="Juuri, jonka alle rel_path lasketaan (suositus)")
+    p_ing.add_argument("--bulk", action="store_true", help="Massaingestointi: FTS-indeksi rakennetaan kerran lopussa")
+    p_ing.add_argument("--fast", action="store_true", help="Nopeammat SQLite-kirjoitukset (synchronous=OFF; riskialtis sähkökatkossa)")
+    p_ing.add_argument("--verify", action="store_true", help="Laske sha256 myös, kun koko ja mtime eivät ole muuttuneet")
+    p_ing.add_argument("--jobs", type=int, default=1, help="Rinnakkaiset purkuprosessit (0 = CPU-ytimien määrä, oletus 1)")
     p_ing.set_defaults(func=cmd_ingest)
 
     p_tl = sub.add_parser("timeline", help="Tulostaa aikajanan")
@@ -93,7 +158,8 @@ def build_parser() -> argparse.ArgumentParser:
     p_n.add_argument("--to", dest="date_to", required=True, help="Loppupäivä (YYYY-MM-DD)")
     p_n.add_argument("--model", default="gpt-4.1-mini", help="OpenAI model (default: gpt-4.1-mini)")
     p_n.add_argument("--max-chars", type=int, default=6000, help="Maksimi merkit per pyyntö")
-    p_n.add_argument("--delay-seconds", type=float, default=1.0, help="Viive chunkien välissä")
+    p_n.add_argument("--delay-seconds", type=float, default=1.0, help="Vähimmäisväli chunk-pyyntöjen aloitusten välissä")
+    p_n.add_argument("--concurrency", type=int, default=4, help="Samanaikaiset chunk-pyynnöt (oletus 4)")
     p_n.add_argument("--out", help="Kirjoita tulos tiedostoon (UTF-8)")
     p_n.set_defaults(func=cmd_narrate)
 
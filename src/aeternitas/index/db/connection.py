@@ -1,15 +1,154 @@
 from __future__ import annotations
 
+import datetime as dt
+import os
+import socket
 import sqlite3
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
-from .schema import SCHEMA_SQL
+from .schema import FTS_TRIGGER_NAMES, FTS_TRIGGERS, SCHEMA_SQL, SCHEMA_VERSION
+
+# UPSERT ... RETURNING (upsert_source)
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+
+# Initialized connections per DB file: repeat opens in one process skip the
+# schema script and migrations. Keyed on (st_dev, st_ino) so a replaced file
+# gets a fresh connection.
+_CONN_CACHE: Dict[Path, Tuple[Tuple[int, int], sqlite3.Connection]] = {}
+# Same for read-only connections (db_connect_reader).
+_READER_CACHE: Dict[Path, Tuple[Tuple[int, int], sqlite3.Connection]] = {}
+
+# Wait this long (ms) for another writer instead of failing with SQLITE_BUSY.
+BUSY_TIMEOUT_MS = 5000
+
+# Page cache (KiB, passed negated) and memory-mapped I/O for reader and writer.
+CACHE_SIZE_KIB = 131072
+MMAP_SIZE = 1 << 30
+# Only takes effect on a DB that has no pages yet (checked before connect).
+NEW_DB_PAGE_SIZE = 8192
+
+# A bulk_ingest marker older than this counts as dead. A longer bulk run only
+# loses its trigger-free speed: the restored triggers keep doc_fts correct.
+BULK_MARKER_TIMEOUT = dt.timedelta(hours=24)
+
+
+def _file_identity(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino)
+
+
+def _cached_con(cache: Dict[Path, Tuple[Tuple[int, int], sqlite3.Connection]], key: Path) -> Optional[sqlite3.Connection]:
+    cached = cache.get(key)
+    if cached is not None and cached[0] == _file_identity(key):
+        con = cached[1]
+        try:
+            con.execute("SELECT 1")
+            return con
+        except sqlite3.ProgrammingError:
+            # closed by a previous user, or used from another thread
+            pass
+    return None
+
+
+def _cache_con(cache: Dict[Path, Tuple[Tuple[int, int], sqlite3.Connection]], key: Path, con: sqlite3.Connection) -> None:
+    ident = _file_identity(key)
+    if ident is not None:
+        cache[key] = (ident, con)
 
 
 def db_connect(path: Path) -> sqlite3.Connection:
+    """
+    Returns a shared, initialized read-write connection for this DB file (per process).
+    """
+    key = Path(path).resolve()
+    con = _cached_con(_CONN_CACHE, key)
+    if con is None:
+        con = _open_db(path)
+        _cache_con(_CONN_CACHE, key, con)
+    return con
+
+
+def db_connect_writer(path: Path) -> sqlite3.Connection:
+    """
+    The single writer connection (ingest). Callers open write transactions
+    with BEGIN IMMEDIATE so the write lock is taken up front.
+    """
+    return db_connect(path)
+
+
+def db_connect_reader(path: Path) -> sqlite3.Connection:
+    """
+    Returns a shared read-only connection (search, timeline, narrate).
+    Creates / migrates the DB through the writer path first if needed.
+    Never repairs FTS: with the triggers missing (ingest --bulk running or
+    interrupted) doc_fts is served as is, see fts_triggers_missing().
+    """
+    key = Path(path).resolve()
+    con = _cached_con(_READER_CACHE, key)
+    if con is not None:
+        return con
+    con = None
+    if key.exists():
+        con = open_readonly(key)
+        if con.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            con.close()
+            con = None
+    if con is None:
+        db_connect(key)
+        con = open_readonly(key)
+    _cache_con(_READER_CACHE, key, con)
+    return con
+
+
+def open_readonly(path: Path) -> sqlite3.Connection:
+    """
+    Plain read-only connection (mode=ro, query_only); no schema or migration work.
+    """
+    con = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA query_only=1")
+    con.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    _set_memory_pragmas(con)
+    return con
+
+
+def _set_memory_pragmas(con: sqlite3.Connection) -> None:
+    con.execute("PRAGMA temp_store=MEMORY")
+    con.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+    con.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+
+
+def _open_db(path: Path) -> sqlite3.Connection:
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise RuntimeError(f"SQLite >= 3.35 required (found {sqlite3.sqlite_version})")
+    is_new = not os.path.exists(path) or os.path.getsize(path) == 0
     con = sqlite3.connect(str(path))
     con.row_factory = sqlite3.Row
+    if is_new:
+        # Before the schema script: WAL and the first table fix the page size.
+        con.execute(f"PRAGMA page_size={NEW_DB_PAGE_SIZE}")
     con.executescript(SCHEMA_SQL)
+    # WAL + synchronous=NORMAL is crash-safe; it only skips the per-commit fsync.
+    con.execute("PRAGMA synchronous=NORMAL")
+    _set_memory_pragmas(con)
+    con.execute("PRAGMA wal_autocheckpoint=10000")
+    con.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    if con.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        _migrate(con)
+    con.commit()
+    repair_fts(con)
+    return con
+
+
+def _migrate(con: sqlite3.Connection) -> None:
+    """
+    One-shot upgrades for DBs created by older versions; bumps user_version.
+    """
     # Backfill columns if DB already existed without them
     cur = con.cursor()
     try:
@@ -21,17 +160,152 @@ def db_connect(path: Path) -> sqlite3.Connection:
     except sqlite3.OperationalError:
         pass
     # Populate current_revision_id for existing sources if missing
-    cur.execute(
+    if cur.execute("SELECT 1 FROM source WHERE current_revision_id IS NULL LIMIT 1").fetchone():
+        cur.execute(
+            """
+            UPDATE source
+            SET current_revision_id = (SELECT MAX(r.id) FROM revision r WHERE r.source_id = source.id)
+            WHERE current_revision_id IS NULL
         """
-        UPDATE source
-        SET current_revision_id = (
-            SELECT r.id FROM revision r
-            WHERE r.source_id = source.id
-            ORDER BY r.id DESC
-            LIMIT 1
         )
-        WHERE current_revision_id IS NULL
+    # v3: process identity on bulk_ingest markers (table added without it)
+    for col in ("host TEXT", "proc_identity TEXT"):
+        try:
+            cur.execute(f"ALTER TABLE bulk_ingest ADD COLUMN {col};")
+        except sqlite3.OperationalError:
+            pass
+    # v2: timeline/search join source on its current revision. Not in SCHEMA_SQL,
+    # which runs before the ALTER above on DBs that predate the column.
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_source_current_rev ON source(current_revision_id)")
+    cur.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+
+def repair_fts(con: sqlite3.Connection, force_unverified: bool = False) -> None:
     """
-    )
-    con.commit()
-    return con
+    Creates missing FTS triggers and rebuilds doc_fts: a new DB, or an
+    ingest --bulk that died before restore_fts_triggers(). A verified live
+    bulk run is left alone (checked without, then again under, the write lock).
+    Markers that can be neither verified nor ruled out (other host, no /proc)
+    also block the repair unless force_unverified (a plain ingest) is set.
+    """
+
+    def needed() -> bool:
+        if not fts_triggers_missing(con):
+            return False
+        live, unknown = _bulk_marker_states(con)
+        return not live and (force_unverified or not unknown)
+
+    if not needed():
+        return
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        if needed():
+            _create_fts_triggers(con)
+            rebuild_fts(con)
+            con.execute("DELETE FROM bulk_ingest")
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+
+
+def _process_identity(pid: int) -> Optional[str]:
+    """
+    "<boot id>:<start time>" of a running process, so a reused pid (or one
+    from another PID namespace) does not match; None without Linux /proc.
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id", encoding="ascii") as f:
+            boot_id = f.read().strip()
+        with open(f"/proc/{pid}/stat", encoding="utf-8", errors="replace") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # field 22 (starttime); comm in parentheses may contain spaces
+    fields = stat.rpartition(")")[2].split()
+    if len(fields) < 20:
+        return None
+    return f"{boot_id}:{fields[19]}"
+
+
+def _bulk_marker_states(con: sqlite3.Connection) -> Tuple[int, int]:
+    """
+    (verified live, unverifiable) bulk_ingest markers; the rest are dead.
+    """
+    cutoff = (dt.datetime.utcnow() - BULK_MARKER_TIMEOUT).isoformat(timespec="seconds") + "Z"
+    host = socket.gethostname()
+    have_proc = _process_identity(os.getpid()) is not None
+    live = unknown = 0
+    for r in con.execute("SELECT pid, started_at, host, proc_identity FROM bulk_ingest"):
+        if r[1] < cutoff:
+            continue
+        if r[2] != host or r[3] is None or not have_proc:
+            unknown += 1
+        elif _process_identity(int(r[0])) == r[3]:
+            live += 1
+        # else: the process is gone, or its pid now belongs to another one
+    return live, unknown
+
+
+def _create_fts_triggers(con: sqlite3.Connection) -> None:
+    for sql in FTS_TRIGGERS:
+        con.execute(sql)
+
+
+def fts_triggers_missing(con: sqlite3.Connection) -> bool:
+    """
+    True while an ingest --bulk has the FTS triggers dropped (or died with
+    them dropped): doc_fts may then lag behind doc.
+    """
+    has_doc = con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='doc'").fetchone()
+    if not has_doc:
+        return False
+    placeholders = ",".join("?" for _ in FTS_TRIGGER_NAMES)
+    n = con.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE type='trigger' AND name IN ({placeholders})",
+        FTS_TRIGGER_NAMES,
+    ).fetchone()[0]
+    return n < len(FTS_TRIGGER_NAMES)
+
+
+def rebuild_fts(con: sqlite3.Connection) -> None:
+    con.execute("INSERT INTO doc_fts(doc_fts) VALUES('rebuild')")
+
+
+def drop_fts_triggers(con: sqlite3.Connection) -> None:
+    """
+    Bulk-load mode: stop per-row doc_fts maintenance.
+    Pair with restore_fts_triggers(), which rebuilds doc_fts once.
+    The bulk_ingest marker row is written in the same transaction, so other
+    connections can tell a running bulk load from one that died.
+    """
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        pid = os.getpid()
+        con.execute(
+            "INSERT INTO bulk_ingest(pid, started_at, host, proc_identity) VALUES (?,?,?,?)",
+            (
+                pid,
+                dt.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                socket.gethostname(),
+                _process_identity(pid),
+            ),
+        )
+        for name in FTS_TRIGGER_NAMES:
+            con.execute(f"DROP TRIGGER IF EXISTS {name}")
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+
+
+def restore_fts_triggers(con: sqlite3.Connection) -> None:
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        _create_fts_triggers(con)
+        rebuild_fts(con)
+        con.execute("DELETE FROM bulk_ingest WHERE pid=?", (os.getpid(),))
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
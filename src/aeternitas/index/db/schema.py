@@ -1,5 +1,31 @@
 from __future__ import annotations
 
+# Stored in PRAGMA user_version; bump when db_connect gains a migration step.
+SCHEMA_VERSION = 3
+
+FTS_TRIGGER_NAMES = ("doc_ai", "doc_au", "doc_ad")
+
+# One statement each: db_connect / restore_fts_triggers create them inside a
+# BEGIN IMMEDIATE transaction, after checking that no ingest --bulk is running.
+FTS_TRIGGERS = (
+    """
+CREATE TRIGGER IF NOT EXISTS doc_ai AFTER INSERT ON doc BEGIN
+  INSERT INTO doc_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
+END
+""",
+    """
+CREATE TRIGGER IF NOT EXISTS doc_au AFTER UPDATE ON doc BEGIN
+  INSERT INTO doc_fts(doc_fts, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+  INSERT INTO doc_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
+END
+""",
+    """
+CREATE TRIGGER IF NOT EXISTS doc_ad AFTER DELETE ON doc BEGIN
+  INSERT INTO doc_fts(doc_fts, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+END
+""",
+)
+
 SCHEMA_SQL = r"""
 PRAGMA journal_mode=WAL;
 PRAGMA foreign_keys=ON;
@@ -39,25 +65,14 @@ CREATE TABLE IF NOT EXISTS doc (
   FOREIGN KEY(revision_id) REFERENCES revision(id)
 );
 
+CREATE INDEX IF NOT EXISTS idx_revision_source ON revision(source_id, id DESC);
+
 -- Full-text search
 CREATE VIRTUAL TABLE IF NOT EXISTS doc_fts USING fts5(
   title, text,
   content='doc', content_rowid='id'
 );
 
-CREATE TRIGGER IF NOT EXISTS doc_ai AFTER INSERT ON doc BEGIN
-  INSERT INTO doc_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
-END;
-
-CREATE TRIGGER IF NOT EXISTS doc_au AFTER UPDATE ON doc BEGIN
-  INSERT INTO doc_fts(doc_fts, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
-  INSERT INTO doc_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
-END;
-
-CREATE TRIGGER IF NOT EXISTS doc_ad AFTER DELETE ON doc BEGIN
-  INSERT INTO doc_fts(doc_fts, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
-END;
-
 CREATE TABLE IF NOT EXISTS timeline (
   id INTEGER PRIMARY KEY,
   doc_id INTEGER NOT NULL,
@@ -70,4 +85,23 @@ CREATE TABLE IF NOT EXISTS timeline (
 );
 
 CREATE INDEX IF NOT EXISTS idx_timeline_date ON timeline(date);
+
+-- Extracted text by content, so identical bytes are not re-OCR'd / re-parsed
+CREATE TABLE IF NOT EXISTS extract_cache (
+  sha256 TEXT NOT NULL,
+  extractor TEXT NOT NULL,
+  extractor_version TEXT NOT NULL,
+  content_encoding TEXT,
+  text TEXT,
+  PRIMARY KEY (sha256, extractor, extractor_version)
+);
+
+-- Running ingest --bulk runs (FTS triggers dropped); a row whose process is
+-- gone means the run died and doc_fts needs a rebuild.
+CREATE TABLE IF NOT EXISTS bulk_ingest (
+  pid INTEGER NOT NULL,
+  started_at TEXT NOT NULL,
+  host TEXT,                     -- socket.gethostname()
+  proc_identity TEXT             -- boot id + process start time (Linux /proc), vs. pid reuse
+);
 """
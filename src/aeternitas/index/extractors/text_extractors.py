@@ -1,38 +1,59 @@
 from __future__ import annotations
 
+import functools
 from pathlib import Path
-from typing import Tuple
+from typing import Any, List, Optional, Tuple
 
 from aeternitas.common.text import safe_read_text
 
-# Optional imports (only used when needed)
-try:
-    from pypdf import PdfReader  # type: ignore
-except Exception:
-    PdfReader = None
 
-try:
-    from odf.opendocument import load as odf_load  # type: ignore
-    from odf import teletype  # type: ignore
-except Exception:
-    odf_load = None
-    teletype = None
+# Optional backends, imported on first use so search/timeline never pay for them.
+# Each accessor returns None when the package is missing (cached, not retried).
+@functools.lru_cache(maxsize=None)
+def _pdf_reader() -> Any:
+    try:
+        from pypdf import PdfReader  # type: ignore
+    except Exception:
+        return None
+    return PdfReader
 
-try:
-    from PIL import Image, ImageOps, ImageEnhance  # type: ignore
-except Exception:
-    Image = None
 
-try:
-    import pytesseract  # type: ignore
-except Exception:
-    pytesseract = None
+@functools.lru_cache(maxsize=None)
+def _odf() -> Optional[Tuple[Any, Any]]:
+    try:
+        from odf.opendocument import load as odf_load  # type: ignore
+        from odf import teletype  # type: ignore
+    except Exception:
+        return None
+    return odf_load, teletype
 
 
-EXTRACTOR_VERSION = "aet.py/1"
+@functools.lru_cache(maxsize=None)
+def _pil() -> Optional[Tuple[Any, Any]]:
+    try:
+        from PIL import Image, ImageOps  # type: ignore
+    except Exception:
+        return None
+    return Image, ImageOps
+
+
+@functools.lru_cache(maxsize=None)
+def _tesseract() -> Any:
+    try:
+        import pytesseract  # type: ignore
+    except Exception:
+        return None
+    return pytesseract
+
+
+EXTRACTOR_VERSION = "aet.py/2"
+
+# Longest image side fed to Tesseract; its runtime scales with pixel count.
+OCR_MAX_SIDE = 2200
 
 
 def extract_text_from_pdf(path: Path) -> str:
+    PdfReader = _pdf_reader()
     if PdfReader is None:
         raise RuntimeError("pypdf puuttuu (pip install pypdf)")
     reader = PdfReader(str(path))
@@ -44,41 +65,88 @@ def extract_text_from_pdf(path: Path) -> str:
 
 
 def extract_text_from_odt(path: Path) -> str:
-    if odf_load is None or teletype is None:
+    odf = _odf()
+    if odf is None:
         raise RuntimeError("odfpy puuttuu (pip install odfpy)")
+    odf_load, teletype = odf
     doc = odf_load(str(path))
     return teletype.extractText(doc.text)
 
 
 def extract_text_from_image_ocr(path: Path, lang: str = "fin") -> str:
-    if Image is None or pytesseract is None:
+    pil = _pil()
+    pytesseract = _tesseract()
+    if pil is None or pytesseract is None:
         raise RuntimeError("pillow/pytesseract puuttuu (pip install pillow pytesseract)")
+    Image, ImageOps = pil
     img = Image.open(str(path))
-    # Perus-esikäsittely: harmaasävy + kontrasti
+    # Esikäsittely: harmaasävy, pienennys, autokontrasti ja Otsu-binarointi
     g = ImageOps.grayscale(img)
-    g = ImageEnhance.Contrast(g).enhance(2.0)
-    # Tesseract toimii usein paremmin ilman binarointia; käytä psm 6 (yhtenäinen tekstialue)
+    w, h = g.size
+    scale = OCR_MAX_SIDE / max(w, h)
+    if scale < 1:
+        g = g.resize((max(1, int(w * scale)), max(1, int(h * scale))), Image.LANCZOS)
+    g = ImageOps.autocontrast(g, cutoff=2)
+    thr = _otsu_threshold(g.histogram())
+    g = g.point([0] * (thr + 1) + [255] * (255 - thr))
+    # psm 6 (yhtenäinen tekstialue)
     config = "--psm 6"
     return pytesseract.image_to_string(g, lang=lang, config=config)
 
 
-def extract_text(path: Path) -> Tuple[str, str, str]:
+def _otsu_threshold(hist: List[int]) -> int:
     """
-    Returns: (text, encoding, extractor_name)
+    Otsu's threshold from a 256-bin grayscale histogram.
+    """
+    total = sum(hist)
+    sum_all = sum(i * n for i, n in enumerate(hist))
+    sum_bg = 0
+    w_bg = 0
+    best_t = 127
+    best_var = -1.0
+    for t in range(256):
+        w_bg += hist[t]
+        if w_bg == 0:
+            continue
+        w_fg = total - w_bg
+        if w_fg == 0:
+            break
+        sum_bg += t * hist[t]
+        diff = sum_bg / w_bg - (sum_all - sum_bg) / w_fg
+        var = w_bg * w_fg * diff * diff
+        if var > best_var:
+            best_var = var
+            best_t = t
+    return best_t
+
+
+def extractor_for(path: Path) -> str:
+    """
+    Extractor name extract_text() will use for this path (by suffix).
     """
     suf = path.suffix.lower()
     if suf in (".txt", ".md", ".csv", ".log"):
-        t, enc = safe_read_text(path)
-        return t, enc, "txt"
+        return "txt"
     if suf == ".odt":
-        t = extract_text_from_odt(path)
-        return t, "utf-8", "odt"
+        return "odt"
     if suf == ".pdf":
-        t = extract_text_from_pdf(path)
-        return t, "utf-8", "pdf"
+        return "pdf"
     if suf in (".jpg", ".jpeg", ".png", ".tif", ".tiff"):
-        t = extract_text_from_image_ocr(path)
-        return t, "utf-8", "ocr"
-    # fallback: yritä tekstiä
+        return "ocr"
+    return "txt-fallback"
+
+
+def extract_text(path: Path) -> Tuple[str, str, str]:
+    """
+    Returns: (text, encoding, extractor_name)
+    """
+    extractor = extractor_for(path)
+    if extractor == "odt":
+        return extract_text_from_odt(path), "utf-8", extractor
+    if extractor == "pdf":
+        return extract_text_from_pdf(path), "utf-8", extractor
+    if extractor == "ocr":
+        return extract_text_from_image_ocr(path), "utf-8", extractor
+    # txt, and fallback: yritä tekstiä
     t, enc = safe_read_text(path)
-    return t, enc, "txt-fallback"
+    return t, enc, extractor
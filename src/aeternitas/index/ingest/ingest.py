@@ -1,18 +1,85 @@
 from __future__ import annotations
 
 import datetime as dt
-import json
+import functools
 import mimetypes
 import os
 import re
 import sqlite3
+import stat as statmod
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from aeternitas.common.hashing import sha256_file
-from aeternitas.index.extractors.text_extractors import EXTRACTOR_VERSION, extract_text
+from aeternitas.common.jsonutil import json_dumps
+from aeternitas.index.db.connection import open_readonly
+from aeternitas.index.extractors.text_extractors import EXTRACTOR_VERSION, extract_text, extractor_for
 from aeternitas.index.parse.receipt import parse_receipt_fields
 
+# Commit the ingest transaction every N files to bound the crash window.
+INGEST_COMMIT_EVERY = 500
+
+# Only these are slow enough to be worth an extract_cache row.
+CACHED_EXTRACTORS = ("pdf", "ocr", "odt")
+
+# Per-file statements, kept in one place (sqlite3 reuses their prepared
+# statements through its per-connection cache, keyed by SQL text).
+_SOURCE_UPSERT_SQL = """
+INSERT INTO source(uri, source_type, scan_root, rel_path, mime, created_at) VALUES(?,?,?,?,?,?)
+ON CONFLICT(uri) DO UPDATE SET
+  mime=COALESCE(excluded.mime, source.mime),
+  scan_root=COALESCE(excluded.scan_root, source.scan_root),
+  rel_path=COALESCE(excluded.rel_path, source.rel_path)
+RETURNING id
+"""
+_LATEST_REVISION_SQL = "SELECT id, size, mtime, sha256, status FROM revision WHERE source_id=? ORDER BY id DESC LIMIT 1"
+_REVISION_INSERT_SQL = (
+    "INSERT INTO revision(source_id, observed_at, size, mtime, sha256, content_encoding, extractor, extractor_version, status, error)"
+    " VALUES (?,?,?,?,?,?,?,?,?,?)"
+)
+_DOC_INSERT_SQL = "INSERT INTO doc(revision_id, title, text, json) VALUES (?,?,?,?)"
+_SET_CURRENT_REVISION_SQL = "UPDATE source SET current_revision_id=? WHERE id=?"
+_EXTRACT_CACHE_LOOKUP_SQL = (
+    "SELECT text, content_encoding FROM extract_cache WHERE sha256=? AND extractor=? AND extractor_version=?"
+)
+_EXTRACT_CACHE_INSERT_SQL = (
+    "INSERT OR IGNORE INTO extract_cache(sha256, extractor, extractor_version, content_encoding, text) VALUES (?,?,?,?,?)"
+)
+
+_FILENAME_DATE_RE = re.compile(r"(19|20)\d{2}[-_.](\d{2})[-_.](\d{2})")
+
+
+@dataclass
+class IngestJob:
+    """A file that needs a new revision (or a sha check, with verify)."""
+    path: Path
+    source_id: int
+    st: os.stat_result
+    is_symlink: bool
+    mime: Optional[str]
+    rel: str
+    known_sha: Optional[str] = None  # set when size+mtime are unchanged (verify)
+
+
+@dataclass
+class Extracted:
+    sha256: Optional[str]
+    title: str
+    text: str
+    encoding: str
+    extractor: str
+    extra_json: Dict[str, Any]
+    status: str = "ok"
+    error: Optional[str] = None
+    cacheable: bool = False  # freshly extracted by a CACHED_EXTRACTORS backend
+
+
+CacheLookup = Callable[[str, str], Optional[Tuple[str, str]]]
+
 
 def upsert_source(
     con: sqlite3.Connection,
@@ -23,24 +90,16 @@ def upsert_source(
     mime: Optional[str],
 ) -> int:
     now = dt.datetime.utcnow().isoformat(timespec="seconds") + "Z"
-    cur = con.execute("SELECT id FROM source WHERE uri=?", (uri,))
-    row = cur.fetchone()
-    if row:
-        con.execute(
-            "UPDATE source SET mime=COALESCE(?, mime), scan_root=COALESCE(?, scan_root), rel_path=COALESCE(?, rel_path) WHERE id=?",
-            (mime, scan_root, rel_path, row["id"]),
-        )
-        return int(row["id"])
     cur = con.execute(
-        "INSERT INTO source(uri, source_type, scan_root, rel_path, mime, created_at) VALUES(?,?,?,?,?,?)",
+        _SOURCE_UPSERT_SQL,
         (uri, source_type, scan_root, rel_path, mime, now),
     )
-    return int(cur.lastrowid)
+    return int(cur.fetchone()[0])
 
 
 def latest_revision(con: sqlite3.Connection, source_id: int) -> Optional[sqlite3.Row]:
     cur = con.execute(
-        "SELECT id, size, mtime, sha256, status FROM revision WHERE source_id=? ORDER BY id DESC LIMIT 1",
+        _LATEST_REVISION_SQL,
         (source_id,),
     )
     return cur.fetchone()
@@ -65,35 +124,39 @@ def add_revision_and_doc(
     observed_at = dt.datetime.utcnow().isoformat(timespec="seconds") + "Z"
     sha = sha256 if not compute_sha else (sha256 or sha256_file(path))
     cur = con.execute(
-        "INSERT INTO revision(source_id, observed_at, size, mtime, sha256, content_encoding, extractor, extractor_version, status, error) VALUES (?,?,?,?,?,?,?,?,?,?)",
+        _REVISION_INSERT_SQL,
         (source_id, observed_at, st.st_size, st.st_mtime, sha, encoding, extractor, EXTRACTOR_VERSION, status, error),
     )
     rev_id = int(cur.lastrowid)
     cur2 = con.execute(
-        "INSERT INTO doc(revision_id, title, text, json) VALUES (?,?,?,?)",
-        (rev_id, title, text, json.dumps(extra_json, ensure_ascii=False)),
+        _DOC_INSERT_SQL,
+        (rev_id, title, text, json_dumps(extra_json)),
     )
-    con.execute("UPDATE source SET current_revision_id=? WHERE id=?", (rev_id, source_id))
+    con.execute(_SET_CURRENT_REVISION_SQL, (rev_id, source_id))
     return int(cur2.lastrowid)
 
 
-def ingest_file(con: sqlite3.Connection, path: Path, scan_root: Optional[Path] = None) -> None:
-    path = path.absolute()
-    is_symlink = path.is_symlink()
-    mime, _ = mimetypes.guess_type(str(path))
-    if is_symlink:
-        st = path.lstat()
-        sha = None
-    else:
-        st = path.stat()
-        sha = sha256_file(path)
-
-    if scan_root:
-        try:
-            rel = str(path.relative_to(scan_root.resolve()))
-        except Exception:
-            rel = path.name
-    else:
+def plan_ingest(
+    con: sqlite3.Connection,
+    path: Path,
+    scan_root: Optional[Path] = None,
+    verify: bool = False,
+    st: Optional[os.stat_result] = None,
+) -> Optional[IngestJob]:
+    """
+    DB-side first half of ingest: record the source and decide whether the
+    file needs work. Returns None when the latest revision is still current.
+    scan_root must already be resolved (cmd_ingest resolves it once per run).
+    A prefetched st (from iter_ingest_paths) must be the lstat of an absolute path.
+    """
+    if st is None:
+        path = path.absolute()
+        # One lstat per file: for anything but a symlink it equals stat().
+        st = os.lstat(path)
+    is_symlink = statmod.S_ISLNK(st.st_mode)
+    mime = _guess_mime(path)
+    rel = _rel_path(str(path), str(scan_root)) if scan_root else None
+    if rel is None:
         rel = path.name
 
     uri = f"file://{rel}" if scan_root else f"file://{path}"
@@ -106,70 +169,123 @@ def ingest_file(con: sqlite3.Connection, path: Path, scan_root: Optional[Path] =
         mime=mime,
     )
     latest = latest_revision(con, source_id)
-    if latest and latest["size"] == st.st_size and latest["mtime"] == st.st_mtime:
-        if sha is not None and latest["sha256"] != sha:
-            pass
-        elif sha is None and latest["sha256"] is not None:
-            pass
-        elif latest["status"] == "ok":
-            return
-
-    if is_symlink:
+    unchanged = (
+        latest is not None
+        and latest["size"] == st.st_size
+        and latest["mtime"] == st.st_mtime
+        and latest["status"] == "ok"
+        # symlinks carry no sha; a file that became a symlink (or back) is a change
+        and (latest["sha256"] is None) == is_symlink
+    )
+    if unchanged and not verify:
+        return None
+    if unchanged and is_symlink:
+        return None
+    return IngestJob(
+        path=path,
+        source_id=source_id,
+        st=st,
+        is_symlink=is_symlink,
+        mime=mime,
+        rel=rel,
+        known_sha=latest["sha256"] if unchanged else None,
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def _mime_for_suffixes(suffixes: str) -> Optional[str]:
+    return mimetypes.guess_type("f" + suffixes)[0]
+
+
+def _guess_mime(path: Path) -> Optional[str]:
+    # guess_type only looks at the last suffix plus an optional compression suffix.
+    return _mime_for_suffixes("".join(path.suffixes[-2:]))
+
+
+def _rel_path(path_str: str, root_str: str) -> Optional[str]:
+    """
+    Lexical path.relative_to(root) on plain strings; None if not under root.
+    """
+    if path_str == root_str:
+        return "."
+    prefix = root_str if root_str.endswith(os.sep) else root_str + os.sep
+    if path_str.startswith(prefix):
+        return path_str[len(prefix):]
+    return None
+
+
+def lookup_extract_cache(con: sqlite3.Connection, sha: str, extractor: str) -> Optional[Tuple[str, str]]:
+    """
+    Returns (text, encoding) extracted earlier from identical content, if any.
+    """
+    row = con.execute(
+        _EXTRACT_CACHE_LOOKUP_SQL,
+        (sha, extractor, EXTRACTOR_VERSION),
+    ).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def extract_file(job: IngestJob, cache_lookup: Optional[CacheLookup] = None) -> Optional[Extracted]:
+    """
+    Hash + extract + parse for one file. Writes nothing to the DB, so it can
+    run in a worker process. Returns None when the sha matches job.known_sha.
+    """
+    path = job.path
+    mime = job.mime
+    rel = job.rel
+
+    if job.is_symlink:
         try:
-            target = os.readlink(path)
+            target = _display_str(os.readlink(path))
         except OSError:
             target = None
-        extra_json = {"mime": mime, "path": str(path), "rel_path": rel, "symlink_target": target}
-        add_revision_and_doc(
-            con,
-            source_id,
-            path,
+        return Extracted(
+            sha256=None,
             title=path.name,
             text="",
             encoding="utf-8",
             extractor="symlink",
-            extra_json=extra_json,
-            status="ok",
-            sha256=None,
-            st=st,
-            compute_sha=False,
+            extra_json={"mime": mime, "path": str(path), "rel_path": rel, "symlink_target": target},
         )
-        return
 
-    # Extract text
+    sha: Optional[str] = None
     try:
-        text, enc, extractor = extract_text(path)
+        # A read error here becomes an error revision like any extraction failure
+        sha = sha256_file(path)
+        if job.known_sha is not None and job.known_sha == sha:
+            return None
+
+        # Extract text
+        extractor = extractor_for(path)
+        cached = cache_lookup(sha, extractor) if cache_lookup and extractor in CACHED_EXTRACTORS else None
+        if cached is not None:
+            text, enc = cached
+        else:
+            text, enc, extractor = extract_text(path)
         extra_json: Dict[str, Any] = {"mime": mime, "path": str(path), "rel_path": rel, "extractor": extractor}
         # If looks like receipt, parse fields
         if extractor in ("pdf", "ocr") or "kuitti" in path.name.lower():
             extra_json["receipt"] = parse_receipt_fields(text)
             # fallback: päivämäärä tiedostonimestä (esim. kuitti-2010-07-30-....jpg)
             if isinstance(extra_json.get("receipt"), dict) and not extra_json["receipt"].get("date"):
-                m = re.search(r"(19|20)\d{2}[-_.](\d{2})[-_.](\d{2})", path.name)
+                m = _FILENAME_DATE_RE.search(path.name)
                 if m:
                     y = int(path.name[m.start() : m.start() + 4])
                     mo = int(m.group(2))
                     d = int(m.group(3))
                     extra_json["receipt"]["date"] = f"{y:04d}-{mo:02d}-{d:02d}"
-        title = path.name
-        add_revision_and_doc(
-            con,
-            source_id,
-            path,
-            title=title,
+        return Extracted(
+            sha256=sha,
+            title=path.name,
             text=text,
             encoding=enc,
             extractor=extractor,
             extra_json=extra_json,
-            status="ok",
-            sha256=sha,
-            st=st,
+            cacheable=cached is None and extractor in CACHED_EXTRACTORS,
         )
     except Exception as e:
-        add_revision_and_doc(
-            con,
-            source_id,
-            path,
+        return Extracted(
+            sha256=sha,
             title=path.name,
             text="",
             encoding="utf-8",
@@ -177,6 +293,188 @@ def ingest_file(con: sqlite3.Connection, path: Path, scan_root: Optional[Path] =
             extra_json={"mime": mime, "path": str(path), "rel_path": rel},
             status="error",
             error=str(e),
-            sha256=sha,
-            st=st,
         )
+
+
+def store_extracted(con: sqlite3.Connection, job: IngestJob, res: Extracted) -> int:
+    if res.cacheable and res.sha256:
+        con.execute(
+            _EXTRACT_CACHE_INSERT_SQL,
+            (res.sha256, res.extractor, EXTRACTOR_VERSION, res.encoding, res.text),
+        )
+    return add_revision_and_doc(
+        con,
+        job.source_id,
+        job.path,
+        title=res.title,
+        text=res.text,
+        encoding=res.encoding,
+        extractor=res.extractor,
+        extra_json=res.extra_json,
+        status=res.status,
+        error=res.error,
+        sha256=res.sha256,
+        st=job.st,
+        compute_sha=False,
+    )
+
+
+def ingest_file(
+    con: sqlite3.Connection,
+    path: Path,
+    scan_root: Optional[Path] = None,
+    verify: bool = False,
+    st: Optional[os.stat_result] = None,
+) -> None:
+    """
+    Unchanged size+mtime skips hashing unless verify is set.
+    """
+    job = plan_ingest(con, path, scan_root=scan_root, verify=verify, st=st)
+    if job is None:
+        return
+    res = extract_file(job, cache_lookup=lambda sha, ext: lookup_extract_cache(con, sha, ext))
+    if res is not None:
+        store_extracted(con, job, res)
+
+
+# Per-worker read-only connection for extract_cache lookups.
+_worker_cache_con: Optional[sqlite3.Connection] = None
+
+
+def _init_extract_worker(db_file: str) -> None:
+    global _worker_cache_con
+    # Tesseract threads internally; with one OCR per worker process that oversubscribes the CPU.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    if db_file:
+        try:
+            _worker_cache_con = open_readonly(Path(db_file))
+        except sqlite3.Error:
+            _worker_cache_con = None
+
+
+def _worker_cache_lookup(sha: str, extractor: str) -> Optional[Tuple[str, str]]:
+    if _worker_cache_con is None:
+        return None
+    try:
+        return lookup_extract_cache(_worker_cache_con, sha, extractor)
+    except sqlite3.Error:
+        return None
+
+
+def _extract_in_worker(job: IngestJob) -> Optional[Extracted]:
+    return extract_file(job, cache_lookup=_worker_cache_lookup)
+
+
+def _display_str(s: str) -> str:
+    # Undecodable bytes (surrogateescape) as \xNN, so the value can be stored as UTF-8
+    return s.encode("utf-8", "surrogateescape").decode("utf-8", "backslashreplace")
+
+
+def _utf8_path(path: str) -> bool:
+    """
+    False (with a stderr note) for a name that is not valid UTF-8; the DB
+    stores paths as text, so such entries are skipped.
+    """
+    try:
+        path.encode("utf-8")
+    except UnicodeEncodeError:
+        print(f"[ingest] Skipping non-UTF-8 path {_display_str(path)}", file=sys.stderr, flush=True)
+        return False
+    return True
+
+
+def iter_ingest_paths(paths: Iterable[Path]) -> Iterator[Tuple[Path, os.stat_result]]:
+    """
+    Yields (absolute path, lstat) per file. Directory arguments are walked
+    with os.scandir in name order, keeping only regular files and symlinks to
+    them (is_file() semantics); symlinks are yielded, never followed.
+    Unreadable subdirectories and non-UTF-8 names are reported on stderr and skipped.
+    """
+    cwd = os.getcwd()
+    for p in paths:
+        path = os.path.join(cwd, p)
+        if not _utf8_path(path):
+            continue
+        st = os.lstat(path)
+        if not statmod.S_ISDIR(st.st_mode):
+            yield Path(path), st
+            continue
+        stack = [path]
+        while stack:
+            d = stack.pop()
+            try:
+                with os.scandir(d) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError as e:
+                print(f"[ingest] Skipping directory {_display_str(d)}: {e}", file=sys.stderr, flush=True)
+                continue
+            subdirs: List[str] = []
+            for e in entries:
+                if not _utf8_path(e.path):
+                    continue
+                try:
+                    # DirEntry.is_dir uses d_type; stat(follow_symlinks=False) is an lstat
+                    if e.is_dir(follow_symlinks=False):
+                        subdirs.append(e.path)
+                        continue
+                    est = e.stat(follow_symlinks=False)
+                    # FIFOs, sockets and devices would block or fail in sha256_file
+                    wanted = statmod.S_ISREG(est.st_mode) or (statmod.S_ISLNK(est.st_mode) and e.is_file())
+                except OSError:
+                    # vanished or unreadable entry
+                    continue
+                if wanted:
+                    yield Path(e.path), est
+            stack.extend(reversed(subdirs))
+
+
+def ingest_files(
+    con: sqlite3.Connection,
+    paths: Iterable[Path],
+    scan_root: Optional[Path] = None,
+    verify: bool = False,
+    jobs: int = 1,
+) -> None:
+    """
+    Ingest many files (directories are walked, see iter_ingest_paths) inside
+    the caller's open transaction, committing every INGEST_COMMIT_EVERY files. With jobs > 1, hashing and extraction run in a
+    process pool; all DB writes stay on this connection.
+    """
+    done = 0
+
+    def file_done() -> None:
+        nonlocal done
+        done += 1
+        if done % INGEST_COMMIT_EVERY == 0:
+            con.commit()
+            con.execute("BEGIN IMMEDIATE")
+
+    if jobs <= 1:
+        for path, st in iter_ingest_paths(paths):
+            ingest_file(con, path, scan_root=scan_root, verify=verify, st=st)
+            file_done()
+        return
+
+    # Workers see extract_cache as of the last commit; that is enough for a cache.
+    db_file = con.execute("PRAGMA database_list").fetchone()[2]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_extract_worker, initargs=(db_file,)) as pool:
+        # Bounded window keeps workers busy without queueing the whole file list.
+        pending: Deque[Tuple[IngestJob, Future]] = deque()
+
+        def store_oldest() -> None:
+            job, fut = pending.popleft()
+            res = fut.result()
+            if res is not None:
+                store_extracted(con, job, res)
+            file_done()
+
+        for path, st in iter_ingest_paths(paths):
+            job = plan_ingest(con, path, scan_root=scan_root, verify=verify, st=st)
+            if job is None:
+                file_done()
+                continue
+            pending.append((job, pool.submit(_extract_in_worker, job)))
+            while len(pending) >= 2 * jobs:
+                store_oldest()
+        while pending:
+            store_oldest()
@@ -1,57 +1,62 @@
 from __future__ import annotations
 
+import io
 import sqlite3
 import sys
 import time
-from typing import List, Tuple
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Iterable, Iterator, List, Tuple
 
 from aeternitas.common.config import get_openai_api_key
 from aeternitas.common.openai_client import call_openai_responses
 
+# Chunk summaries requested at once (narrate --concurrency)
+NARRATE_CONCURRENCY = 4
 
-def fetch_timeline_rows(
+
+def iter_timeline_rows(
     con: sqlite3.Connection,
     date_from: str,
     date_to: str,
-) -> List[sqlite3.Row]:
+) -> Iterator[sqlite3.Row]:
     q = """
     SELECT t.date, t.kind, t.title, t.snippet, t.doc_id
     FROM timeline t
     WHERE t.date >= ? AND t.date <= ?
     ORDER BY t.date ASC
     """
-    return con.execute(q, (date_from, date_to)).fetchall()
+    # Kursori suoraan: rivit luetaan sitä mukaa kuin niitä kulutetaan
+    return con.execute(q, (date_from, date_to))
 
 
-def build_items_text(rows: List[sqlite3.Row]) -> str:
-    lines: List[str] = []
+def iter_item_lines(rows: Iterable[sqlite3.Row]) -> Iterator[str]:
     for r in rows:
         date = r["date"]
         kind = r["kind"]
         title = r["title"] or ""
         snippet = r["snippet"] or ""
-        lines.append(f"- {date} [{kind}] {title}: {snippet}")
-    return "\n".join(lines)
-
-
-def chunk_text(text: str, max_chars: int) -> List[str]:
-    if len(text) <= max_chars:
-        return [text]
-    chunks: List[str] = []
-    cur: List[str] = []
-    cur_len = 0
-    for line in text.splitlines():
-        add_len = len(line) + 1
-        if cur_len + add_len > max_chars and cur:
-            chunks.append("\n".join(cur))
-            cur = [line]
-            cur_len = len(line) + 1
-        else:
-            cur.append(line)
-            cur_len += add_len
-    if cur:
-        chunks.append("\n".join(cur))
-    return chunks
+        yield f"- {date} [{kind}] {title}: {snippet}"
+
+
+def chunk_lines(lines: Iterable[str], max_chars: int) -> Iterator[str]:
+    """
+    Joins lines with newlines into chunks of at most max_chars
+    (a single longer line becomes its own chunk).
+    """
+    buf = io.StringIO()
+    for line in lines:
+        pos = buf.tell()
+        if pos and pos + 1 + len(line) > max_chars:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            pos = 0
+        if pos:
+            buf.write("\n")
+        buf.write(line)
+    if buf.tell():
+        yield buf.getvalue()
 
 
 def summarize_chunk(model: str, text: str) -> str:
@@ -75,21 +80,37 @@ def narrate(
     model: str,
     max_chars: int = 6000,
     delay_seconds: float = 1.0,
+    concurrency: int = NARRATE_CONCURRENCY,
 ) -> Tuple[str, List[str]]:
-    rows = fetch_timeline_rows(con, date_from, date_to)
-    items_text = build_items_text(rows)
-    if not items_text.strip():
-        return ("", [])
-
-    chunks = chunk_text(items_text, max_chars=max_chars)
-    print(f"[narrate] {len(chunks)} chunks to summarize.", file=sys.stderr, flush=True)
+    rows = iter_timeline_rows(con, date_from, date_to)
+    chunks = chunk_lines(iter_item_lines(rows), max_chars=max_chars)
     summaries: List[str] = []
-    for i, ch in enumerate(chunks, start=1):
-        print(f"[narrate] Summarizing chunk {i}/{len(chunks)}...", file=sys.stderr, flush=True)
-        summaries.append(summarize_chunk(model=model, text=ch))
-        print(f"[narrate] Chunk {i}/{len(chunks)} done.", file=sys.stderr, flush=True)
-        if delay_seconds > 0 and i < len(chunks):
-            time.sleep(delay_seconds)
+    # API calls are I/O-bound: keep up to `concurrency` in flight, collect in order.
+    concurrency = max(1, concurrency)
+    pending: Deque[Tuple[int, Future[str]]] = deque()
+
+    def collect_oldest() -> None:
+        i, fut = pending.popleft()
+        summaries.append(fut.result())
+        print(f"[narrate] Chunk {i} done.", file=sys.stderr, flush=True)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        next_start = 0.0
+        for i, ch in enumerate(chunks, start=1):
+            while len(pending) >= concurrency:
+                collect_oldest()
+            # delay_seconds = vähimmäisväli pyyntöjen aloitusten välillä
+            wait = next_start - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            next_start = time.monotonic() + delay_seconds
+            print(f"[narrate] Summarizing chunk {i}...", file=sys.stderr, flush=True)
+            pending.append((i, pool.submit(summarize_chunk, model, ch)))
+        while pending:
+            collect_oldest()
+    if not summaries:
+        return ("", [])
+    print(f"[narrate] {len(summaries)} chunks summarized.", file=sys.stderr, flush=True)
 
     api_key = get_openai_api_key()
     if not api_key:
@@ -6,10 +6,12 @@ from typing import Any, Dict, List, Optional
 
 from aeternitas.common.text import normalize_ws
 
-WEEKDAYS_FI = r"(?:ma|ti|ke|to|pe|la|su|Ma|Ti|Ke|To|Pe|La|Su)"
+# ma|ti|ke|to|pe|la|su, lower- or capitalized; factored so fewer branches are tried
+WEEKDAYS_FI = r"(?:[Mm]a|[Tt][io]|[Kk]e|[Pp]e|[Ll]a|[Ss]u)"
 # Date token used for robust scanning within text, not just line-starts.
+# The leading lookahead rejects most positions before trying the weekday branches.
 DATE_TOKEN_RE = re.compile(
-    rf"(?:{WEEKDAYS_FI}\s+)?(\d{{1,2}})\.(\d{{1,2}})\.(?:\s*(\d{{4}}))?\s*\.?",
+    rf"(?=[0-9MmTtKkPpLlSs])(?:{WEEKDAYS_FI}\s+)?(\d{{1,2}})\.(\d{{1,2}})\.(?:\s*(\d{{4}}))?\s*\.?",
     flags=re.UNICODE,
 )
 
@@ -24,20 +26,20 @@ def parse_diary_entries(text: str, default_year: Optional[int]) -> List[Dict[str
     if not matches:
         return entries
 
-    for i, m in enumerate(matches):
-        d = int(m.group(1))
-        mo = int(m.group(2))
-        y = int(m.group(3)) if m.group(3) else default_year
-        if y is None:
-            y = dt.date.today().year
+    if default_year is None:
+        default_year = dt.date.today().year
+    _date = dt.date
+    # Each body runs up to the next date token (invalid dates included).
+    body_ends = [m.start() for m in matches[1:]]
+    body_ends.append(len(text))
+    for m, body_end in zip(matches, body_ends):
+        d, mo, y = m.groups()
         try:
-            cur_date = dt.date(y, mo, d)
+            cur_date = _date(int(y) if y else default_year, int(mo), int(d))
         except ValueError:
             continue
 
-        body_start = m.end()
-        body_end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
-        body = text[body_start:body_end].strip()
+        body = text[m.end():body_end].strip()
         title = _choose_title(body, cur_date)
         entries.append({
             "date": cur_date,
@@ -55,7 +57,8 @@ def _choose_title(body: str, date: dt.date) -> str:
     """
     if not body:
         return f"Merkintä {date.isoformat()}"
-    first = normalize_ws(body.splitlines()[0])
+    # Only the first line is needed; avoid splitting the whole entry body.
+    first = normalize_ws(body.partition("\n")[0].splitlines()[0])
     if _looks_like_heading(first):
         return first
     return f"Merkintä {date.isoformat()}"
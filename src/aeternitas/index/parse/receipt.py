@@ -6,6 +6,23 @@ from typing import Any, Dict, List
 
 from aeternitas.common.text import normalize_ws
 
+# Date and total candidates in one scan of the joined text. Every alternative is
+# a lookahead, so overlapping candidates (a date right after "Yhteensä 3,70")
+# are still seen, exactly as with separate searches.
+_FIELDS_RE = re.compile(
+    r"(?=(?P<date>\b(?P<day>\d{1,2})\.(?P<month>\d{1,2})\.(?P<year>\d{4})\b))"
+    r"|(?=(?P<total_pay>Maksettava\s+(?P<pay>[0-9]+[,.][0-9]{2})))"
+    r"|(?=(?P<total_sum>Yhteens[aä].{0,20}\s+(?P<sum>[0-9]+[,.][0-9]{2})))"
+    r"|(?=(?P<eur>\b(?P<eur_amount>[0-9]+[,.][0-9]{2})\s*(?:EUR|e)\b))",
+    flags=re.IGNORECASE,
+)
+_MERCHANT_SUFFIX_RE = re.compile(r"\b(oyj|oy|ab|ltd|inc)\b", flags=re.IGNORECASE)
+_SKIP_TOTALS_RE = re.compile(r"\b(maksettava|yhteens|alennus|veroton|vero|alv)\b", flags=re.IGNORECASE)
+_ITEM_RE = re.compile(r"^([A-ZÅÄÖ0-9][A-ZÅÄÖ0-9 \-\/]{2,})\s+([0-9]+[,.][0-9]{2})\b")
+# _ITEM_RE's first character class, for rejecting lines before any regex runs
+_ITEM_FIRST_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZÅÄÖ0123456789")
+_ADDR_RE = re.compile(r"\b(TURKU|HELSINKI|puh|www)\b", flags=re.IGNORECASE)
+
 
 def parse_receipt_fields(text: str) -> Dict[str, Any]:
     """
@@ -14,56 +31,66 @@ def parse_receipt_fields(text: str) -> Dict[str, Any]:
     """
     # Normalize OCR noise a bit
     t = text.replace("\u00a0", " ")
-    t = re.sub(r"[ \t]+", " ", t)
-    lines = [normalize_ws(x) for x in t.splitlines() if normalize_ws(x)]
+    lines = [ln for ln in (normalize_ws(x) for x in t.splitlines()) if ln]
     joined = "\n".join(lines)
 
     # merchant: take first line that looks like COMPANY + oy/oyj/ab, else first non-empty
     merchant = None
     for ln in lines[:10]:
-        if re.search(r"\b(oyj|oy|ab|ltd|inc)\b", ln, flags=re.IGNORECASE):
+        if _MERCHANT_SUFFIX_RE.search(ln):
             merchant = ln
             break
     if merchant is None and lines:
         merchant = lines[0]
 
-    # date: dd.mm.yyyy
+    # date: first dd.mm.yyyy
+    # total: prefer "Maksettava", fallback to "Yhteensä", then last EUR amount
     date = None
-    m = re.search(r"\b(\d{1,2})\.(\d{1,2})\.(\d{4})\b", joined)
-    if m:
-        d, mo, y = map(int, m.groups())
-        try:
-            date = dt.date(y, mo, d)
-        except ValueError:
-            date = None
-
-    # total: prefer "Maksettava", fallback to "Yhteensä"
-    total = None
-    m = re.search(r"Maksettava\s+([0-9]+[,.][0-9]{2})", joined, flags=re.IGNORECASE)
-    if m:
-        total = m.group(1).replace(",", ".")
-    else:
-        m = re.search(r"Yhteens[aä].{0,20}\s+([0-9]+[,.][0-9]{2})", joined, flags=re.IGNORECASE)
-        if m:
-            total = m.group(1).replace(",", ".")
-        else:
-            # fallback: last EUR amount
-            m2 = re.findall(r"\b([0-9]+[,.][0-9]{2})\s*(?:EUR|e)\b", joined, flags=re.IGNORECASE)
-            if m2:
-                total = m2[-1].replace(",", ".")
+    date_seen = False
+    total_pay = total_sum = total_eur = None
+    for m in _FIELDS_RE.finditer(joined):
+        kind = m.lastgroup
+        if kind == "date":
+            if not date_seen:
+                date_seen = True
+                try:
+                    date = dt.date(int(m.group("year")), int(m.group("month")), int(m.group("day")))
+                except ValueError:
+                    date = None
+        elif kind == "total_pay":
+            if total_pay is None:
+                total_pay = m.group("pay")
+        elif kind == "total_sum":
+            if total_sum is None:
+                total_sum = m.group("sum")
+        elif kind == "eur":
+            total_eur = m.group("eur_amount")
+        if date_seen and total_pay is not None:
+            break
+    total = total_pay or total_sum or total_eur
+    if total is not None:
+        total = total.replace(",", ".")
 
     # items: look for lines with product-ish and amount
     items: List[Dict[str, Any]] = []
+    # bound methods: one attribute lookup per parse, not per line
+    skip_search = _SKIP_TOTALS_RE.search
+    item_match = _ITEM_RE.match  # anchored with ^, so match == search
+    addr_search = _ADDR_RE.search
+    item_first = _ITEM_FIRST_CHARS
     for ln in lines:
+        # most lines cannot start an item; lines are non-empty here
+        if ln[0] not in item_first:
+            continue
         # skip obvious totals
-        if re.search(r"\b(maksettava|yhteens|alennus|veroton|vero|alv)\b", ln, flags=re.IGNORECASE):
+        if skip_search(ln):
             continue
-        m = re.search(r"^([A-ZÅÄÖ0-9][A-ZÅÄÖ0-9 \-\/]{2,})\s+([0-9]+[,.][0-9]{2})\b", ln)
+        m = item_match(ln)
         if m:
             name = normalize_ws(m.group(1))
             price = m.group(2).replace(",", ".")
             # avoid addresses/phones
-            if re.search(r"\b(TURKU|HELSINKI|puh|www)\b", name, flags=re.IGNORECASE):
+            if addr_search(name):
                 continue
             items.append({"name": name[:120], "price": price})
 
@@ -1,51 +1,90 @@
 from __future__ import annotations
 
-import json
 import sqlite3
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator, List, Tuple
 
 from aeternitas.common.text import infer_year_from_path, normalize_ws
 from aeternitas.common.timeutil import iso_date
 from aeternitas.index.parse.diary import parse_diary_entries
 
+TIMELINE_BATCH_N = 1000
+
+_EMPTY_JSON = "{}"
+
+_TIMELINE_INSERT_SQL = "INSERT INTO timeline(doc_id, date, kind, title, snippet, json) VALUES(?,?,?,?,?,?)"
+
+# Current revisions only
+_CURRENT_DOCS_SQL = """
+    FROM doc d
+    JOIN revision r ON r.id = d.revision_id
+    JOIN source s ON s.current_revision_id = r.id
+    WHERE r.status = 'ok'
+"""
+
+# doc.json has a receipt object with a date
+_IS_RECEIPT_SQL = "(json_type(d.json, '$.receipt') = 'object' AND json_extract(d.json, '$.receipt.date') <> '')"
+
 
 def rebuild_timeline(con: sqlite3.Connection) -> None:
+    """
+    Rebuild the timeline table. Runs inside the caller's transaction
+    (cmd_ingest), so the DELETE and the new rows become visible atomically.
+    """
     con.execute("DELETE FROM timeline")
-    # Create timeline items for each doc (current revisions only)
+
+    # Receipts: straight from doc.json, no Python round-trip per row
+    con.execute(
+        f"""
+        INSERT INTO timeline(doc_id, date, kind, title, snippet, json)
+        SELECT d.id,
+               json_extract(d.json, '$.receipt.date'),
+               'receipt',
+               COALESCE(d.title, ''),
+               substr(COALESCE(json_extract(d.json, '$.receipt.merchant'), '') || ' total '
+                      || COALESCE(json_extract(d.json, '$.receipt.total'), ''), 1, 300),
+               json_extract(d.json, '$.receipt')
+        {_CURRENT_DOCS_SQL}
+          AND {_IS_RECEIPT_SQL}
+        """
+    )
+
+    # Diary-like split for everything else
     cur = con.execute(
+        f"""
+        SELECT d.id AS doc_id, d.title, d.text
+        {_CURRENT_DOCS_SQL}
+          AND {_IS_RECEIPT_SQL} IS NOT TRUE
         """
-        SELECT d.id AS doc_id, d.title, d.text, d.json
-        FROM doc d
-        JOIN revision r ON r.id = d.revision_id
-        JOIN source s ON s.current_revision_id = r.id
-        WHERE r.status = 'ok'
-    """
     )
-    for row in cur.fetchall():
+    rows: List[Tuple[Any, ...]] = []
+    for row in _iter_rows(cur):
         doc_id = int(row["doc_id"])
         title = row["title"] or ""
         text = row["text"] or ""
-        meta = json.loads(row["json"] or "{}")
-
-        # Receipts
-        receipt = meta.get("receipt") if isinstance(meta, dict) else None
-        if isinstance(receipt, dict) and receipt.get("date"):
-            d = receipt["date"]
-            snippet = f"{receipt.get('merchant','')} total {receipt.get('total','')}"
-            con.execute(
-                "INSERT INTO timeline(doc_id, date, kind, title, snippet, json) VALUES(?,?,?,?,?,?)",
-                (doc_id, d, "receipt", title, snippet[:300], json.dumps(receipt, ensure_ascii=False)),
-            )
-            continue
-
-        # Diary-like split
         default_year = infer_year_from_path(Path(title))
         entries = parse_diary_entries(text, default_year)
         for ent in entries[:2000]:
             d = iso_date(ent["date"])
             snip = normalize_ws(ent["body"][:300])
-            con.execute(
-                "INSERT INTO timeline(doc_id, date, kind, title, snippet, json) VALUES(?,?,?,?,?,?)",
-                (doc_id, d, "diary_entry", ent["title"], snip, json.dumps({}, ensure_ascii=False)),
-            )
+            rows.append((doc_id, d, "diary_entry", ent["title"], snip, _EMPTY_JSON))
+
+        if len(rows) >= TIMELINE_BATCH_N:
+            _insert_timeline_rows(con, rows)
+            rows.clear()
+
+    if rows:
+        _insert_timeline_rows(con, rows)
+
+
+def _iter_rows(cur: sqlite3.Cursor) -> Iterator[sqlite3.Row]:
+    # fetchmany: only TIMELINE_BATCH_N doc texts in memory at a time
+    while True:
+        chunk = cur.fetchmany(TIMELINE_BATCH_N)
+        if not chunk:
+            return
+        yield from chunk
+
+
+def _insert_timeline_rows(con: sqlite3.Connection, rows: List[Tuple[Any, ...]]) -> None:
+    con.executemany(_TIMELINE_INSERT_SQL, rows)